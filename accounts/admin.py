@@ -1,12 +1,130 @@
+import datetime
+
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 
+from accounts.invites import ALPHABET, CODE_LENGTH
 from accounts.models import Profile
+from config import settings
+
+# параметр списка для режима keyset-пагинации: ?after=<id> - записи с id больше заданного
+KEYSET_VAR = 'after'
+
+
+def phone_prefix_range(term):
+    """
+    Границы номеров с префиксом term: номер - ровно 10 цифр (CK_phone), поэтому префикс
+    превращается в диапазон по уникальному индексу на phone при любой сортировке (collation) базы.
+    None - если term не может быть началом номера.
+    """
+    term = term.strip().lstrip('+')
+    if not term.isdigit() or len(term) > 10:
+        return None
+    return term.ljust(10, '0'), term.ljust(10, '9')
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Без COUNT(*) по всей таблице: для списка без фильтров на PostgreSQL берётся оценка
+    из статистики (pg_class.reltuples), иначе считается не больше ADMIN_COUNT_LIMIT строк.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset[:limit].count()
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 - таблица ещё ни разу не анализировалась
+        return int(row[0]) if row and row[0] >= 0 else None
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Список с ?after=<id>: следующая страница берётся по индексу первичного ключа
+    (WHERE id > after ORDER BY id LIMIT n) без OFFSET и подсчёта строк.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.keyset = KEYSET_VAR in request.GET
+        self.next_after = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(KEYSET_VAR, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        if self.keyset:
+            return ['pk']
+        return super().get_ordering(request, queryset)
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super().get_results(request)
+        try:
+            after = int(self.params.get(KEYSET_VAR) or 0)
+        except ValueError:
+            after = 0
+        rows = list(self.queryset.filter(pk__gt=after)[:self.list_per_page + 1])
+        self.result_list = rows[:self.list_per_page]
+        self.result_count = len(self.result_list)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = bool(self.result_count)
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        if len(rows) > self.list_per_page:
+            self.next_after = self.result_list[-1].pk
+
+    def next_page_url(self):
+        return self.get_query_string({KEYSET_VAR: self.next_after}) if self.next_after is not None else None
+
+    def keyset_url(self):
+        return self.get_query_string({KEYSET_VAR: 0}, [PAGE_VAR])
 
 
-class PhoneUserAdmin(UserAdmin):
+class ScalableAdminMixin:
+    """Списки больших таблиц: оценка числа строк, keyset-режим, поиск номера по префиксу."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # путь к номеру телефона для поиска по префиксу
+    phone_lookup = 'phone'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        if bounds := phone_prefix_range(search_term):
+            return queryset.filter(**{f'{self.phone_lookup}__range': bounds}), False
+        return queryset.none(), False
+
+
+class PhoneUserAdmin(ScalableAdminMixin, UserAdmin):
     """Define admin model for custom User model with no username field."""
     fieldsets = (
         (None, {'fields': ('phone', 'password')}),
@@ -22,9 +140,68 @@ class PhoneUserAdmin(UserAdmin):
         }),
     )
     list_display = ('phone', 'first_name', 'last_name', 'is_staff')
-    search_fields = ('phone', 'first_name', 'last_name')
+    # поиск - только по началу номера (см. phone_prefix_range): по имени пришлось бы читать всю таблицу
+    search_fields = ('phone',)
+    search_help_text = "Номер телефона или его начало"
     ordering = ('phone',)
 
 
+class PendingOtpFilter(admin.SimpleListFilter):
+    """Выдан код, который ещё можно ввести: по частичному индексу IX_profile_otptime."""
+    title = "ожидает ввода OTP"
+    parameter_name = 'pending_otp'
+
+    def lookups(self, request, model_admin):
+        return [('1', "Да")]
+
+    def queryset(self, request, queryset):
+        if self.value() == '1':
+            alive_since = timezone.now() - datetime.timedelta(seconds=settings.OTP_LIFETIME)
+            return queryset.filter(otptime__gt=alive_since, otpattempts__gt=1)
+        return queryset
+
+
+class InvitedByFilter(admin.SimpleListFilter):
+    """
+    Приглашённые по коду: по индексу IX_profile_invited. В списке - пригласившие с наибольшим
+    числом прямых последователей (индекс IX_profile_followers), любой код - через ?invited_by=<код>.
+    """
+    title = "приглашён по коду"
+    parameter_name = 'invited_by'
+
+    def lookups(self, request, model_admin):
+        top = (Profile.objects.filter(followers_direct__gt=0).order_by('-followers_direct')
+               .values_list('invite', 'user__phone', 'followers_direct')[:settings.ADMIN_TOP_INVITERS])
+        return [(invite, f"{phone} ({invite}, {count})") for invite, phone, count in top]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(invited=self.value())
+        return queryset
+
+
+@admin.register(Profile)
+class ProfileAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('user', 'invite', 'invited', 'followers_direct', 'followers_total', 'otptime')
+    list_select_related = ('user',)
+    list_filter = (PendingOtpFilter, InvitedByFilter)
+    # выпадающий список на миллионы пользователей не отрисовать - только id со всплывающим поиском
+    raw_id_fields = ('user',)
+    search_fields = ('user__phone',)
+    search_help_text = "Номер телефона или его начало, либо пригласительный код"
+    phone_lookup = 'user__phone'
+    ordering = ('-pk',)
+    readonly_fields = ('followers_direct', 'followers_total', 'avatar_variants')
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip().lower()
+        if len(term) != CODE_LENGTH or not set(term) <= set(ALPHABET):
+            return super().get_search_results(request, queryset, search_term)
+        # шесть символов могут быть и кодом, и началом номера - оба условия по индексам
+        condition = Q(invite=term)
+        if bounds := phone_prefix_range(term):
+            condition |= Q(user__phone__range=bounds)
+        return queryset.filter(condition), False
+
+
 admin.site.register(get_user_model(), PhoneUserAdmin)
-admin.site.register(Profile)
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""
+Асинхронные варианты API /api/v1/ для запуска под ASGI (config.asgi).
+Включаются настройкой API_ASYNC; ответы совпадают с accounts.views.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model, alogin
+from django.http import JsonResponse, HttpResponseNotModified
+from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from rest_framework import status
+
+from accounts.avatars import absolute_avatar_url
+from accounts.invite_filter import ainvite_exists
+from accounts.loaders import ProfileLoader
+from accounts.models import Profile
+from accounts.otp_store import get_otp_store, OTP_OK, OTP_INVALID, OTP_EXHAUSTED
+from accounts.profile_cache import get_profile_cache, profile_data, absolute_profile_data, not_modified
+from accounts.ratelimit import ratelimit
+from accounts.referrals import attach_follower
+from accounts.routers import read_from_replica
+from accounts.serializers import OTPSerializer, LoginUserSerializer, ProfileOut, ProfileInUserSerializer
+from accounts.signup import login_or_create
+from accounts.utils import OtpSender
+
+
+def api_response(data, status_code=status.HTTP_200_OK) -> JsonResponse:
+    return JsonResponse(data, status=status_code, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def request_data(request) -> dict:
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST.dict()
+
+
+def profile_response(user, profile, followers, followers_count, avatar=None) -> JsonResponse:
+    return api_response(ProfileOut.from_instances(user, profile, followers, followers_count, avatar).data)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncApiView(View):
+
+    @staticmethod
+    def validated(request, serializer_class):
+        """Разобрать тело запроса; None и ответ 400 - если данные некорректны."""
+        try:
+            serializer = serializer_class(data=request_data(request))
+        except ValueError:
+            return None, api_response({'detail': 'JSON parse error'}, status.HTTP_400_BAD_REQUEST)
+        if not serializer.is_valid():
+            return None, api_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        return serializer, None
+
+
+class AsyncLoginOTPAPIView(AsyncApiView):
+
+    @method_decorator(ratelimit('otp_verify'))
+    async def post(self, request, *args, **kwargs):
+        serializer, error = self.validated(request, OTPSerializer)
+        if error:
+            return error
+        phone = kwargs.get('phone')
+        try:
+            result = await get_otp_store().averify(phone, int(serializer.initial_data.get('otp')))
+            if result == OTP_OK:
+                await alogin(request, await get_user_model().objects.aget(phone=phone))
+            elif result == OTP_INVALID:
+                return api_response({'detail': 'Не корректный пароль!'}, status.HTTP_401_UNAUTHORIZED)
+            elif result == OTP_EXHAUSTED:
+                return api_response({'detail': 'Исчерпано количество попыток!'}, status.HTTP_429_TOO_MANY_REQUESTS)
+            else:
+                return api_response({'detail': 'Время жизни пароля истекло!'}, status.HTTP_408_REQUEST_TIMEOUT)
+        except Exception as err:
+            return api_response({'detail': f'Ошибка регистрации {err}'}, status.HTTP_400_BAD_REQUEST)
+        return api_response({'detail': 'login successful'})
+
+
+class AsyncLoginOrCreateAPIView(AsyncApiView):
+
+    @method_decorator(ratelimit('otp_issue'))
+    async def post(self, request, *args, **kwargs):
+        serializer, error = self.validated(request, LoginUserSerializer)
+        if error:
+            return error
+        phone = serializer.data.get('phone')
+        try:
+            user, otp = await sync_to_async(login_or_create)(phone)
+        except Exception as err:
+            return api_response({'detail': f'Ошибка регистрации {err}'}, status.HTTP_400_BAD_REQUEST)
+        if otp:
+            if not await OtpSender(phone, otp).asend_otp_on_phone():
+                return api_response({'detail': 'Сервис отправки SMS перегружен. Попробуйте позже!'},
+                                    status.HTTP_503_SERVICE_UNAVAILABLE)
+        else:
+            return api_response({'detail': 'Превышено время повторной выдачи пароля. Попробуйте позже!'},
+                                status.HTTP_429_TOO_MANY_REQUESTS)
+        return api_response({'detail': f'your OTP is {otp}',
+                             'login_url': f'{reverse_lazy("OTPLogin", args=[phone])}'})
+
+
+class AsyncProfileAPIUpdate(AsyncApiView):
+
+    async def post(self, request, *args, **kwargs):
+        serializer, error = self.validated(request, ProfileInUserSerializer)
+        if error:
+            return error
+        phone, avatar_size = serializer.data.get('phone'), serializer.data.get('avatar_size')
+
+        async def build():
+            with read_from_replica(phone):
+                return profile_data(await ProfileLoader(phone).aload(), avatar_size)
+
+        found = await get_profile_cache().afetch(phone, avatar_size or '', build)
+        if found is None:
+            return api_response({'detail': 'Пользователь не найден!'}, status.HTTP_404_NOT_FOUND)
+        data, etag = found
+        if not_modified(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = api_response(absolute_profile_data(request, data))
+        response['ETag'] = etag
+        return response
+
+    async def put(self, request, *args, **kwargs):
+        serializer, error = self.validated(request, ProfileInUserSerializer)
+        if error:
+            return error
+        phone = serializer.data.get('phone')
+        invited = serializer.data.get('invited')
+        if await Profile.objects.filter(user__phone=phone).aexists():
+            return api_response({'detail': 'Телефон уже зарегистрирован!'}, status.HTTP_409_CONFLICT)
+        if invited and not await ainvite_exists(invited):
+            return api_response({'detail': 'Этот пригласительный код не существует!'}, status.HTTP_404_NOT_FOUND)
+        try:
+            user = await sync_to_async(get_user_model().objects.create_phone_user)(
+                phone, invited=invited or None, email=serializer.data.get('email') or '',
+                first_name=serializer.data.get('first_name') or '', last_name=serializer.data.get('last_name') or '')
+        except Exception as err:
+            return api_response({'detail': f'Ошибка внесения пользователя в систему {err}'},
+                                status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return profile_response(user, user.Profile, [], 0)
+
+    async def patch(self, request, *args, **kwargs):
+        serializer, error = self.validated(request, ProfileInUserSerializer)
+        if error:
+            return error
+        new_invited = serializer.data.get('invited')
+        new_email = serializer.data.get('email')
+        new_first_name = serializer.data.get('first_name')
+        new_last_name = serializer.data.get('last_name')
+        loader = await ProfileLoader(serializer.data.get('phone')).aload(followers=False)
+        user, profile = loader.user, loader.profile
+        if not profile:
+            return api_response({'detail': 'Такого пользователя не существует!'}, status.HTTP_404_NOT_FOUND)
+        if new_invited or new_email or new_first_name or new_last_name:
+            if str(new_invited) == str(profile.invite):
+                return api_response({'detail': f'Нельзя пригласить самого себя!'}, status.HTTP_409_CONFLICT)
+            if new_invited and not await ainvite_exists(new_invited):
+                return api_response({'detail': 'Этот пригласительный код не существует!'}, status.HTTP_404_NOT_FOUND)
+            try:
+                if new_email: user.email = new_email
+                if new_first_name: user.first_name = new_first_name
+                if new_last_name: user.last_name = new_last_name
+                attach = bool(new_invited and not profile.invited)
+                if attach: profile.invited = new_invited
+                # только изменённые поля - как в ProfileAPIUpdate.patch
+                changed = [field for field, value in (('email', new_email), ('first_name', new_first_name),
+                                                      ('last_name', new_last_name)) if value]
+                if changed: await user.asave(update_fields=changed)
+                if attach:
+                    await profile.asave(update_fields=['invited'])
+                    await sync_to_async(attach_follower)(profile)
+            except Exception as err:
+                return api_response({'detail': f'Ошибка изменения пользователя в системе {err}'},
+                                    status.HTTP_500_INTERNAL_SERVER_ERROR)
+        await loader.aload()
+        return profile_response(user, profile, loader.follower_phones, loader.followers_count,
+                                absolute_avatar_url(request, profile, serializer.data.get('avatar_size')))
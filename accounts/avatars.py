@@ -0,0 +1,99 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from accounts.backends import forget_user
+from accounts.models import Profile
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.AVATAR_WORKERS, thread_name_prefix='avatars')
+        return _executor
+
+
+def variant_name(digest, size) -> str:
+    return f'avatars/{digest}/{size}.webp'
+
+
+def build_variants(source_name) -> dict:
+    """
+    Прочитать исходник один раз и сохранить квадратные WebP-миниатюры AVATAR_SIZES
+    под именами по хешу содержимого. Одинаковые загрузки переиспользуют готовые файлы.
+    """
+    with default_storage.open(source_name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    names = {size: variant_name(digest, size) for size in settings.AVATAR_SIZES}
+    missing = [size for size, name in names.items() if not default_storage.exists(name)]
+    if missing:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for size in sorted(missing, reverse=True):
+            # от большего к меньшему: каждое уменьшение - из уже уменьшенной копии
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, 'WEBP', quality=settings.AVATAR_QUALITY)
+            saved = default_storage.save(names[size], ContentFile(buffer.getvalue()))
+            if saved != names[size]:
+                # то же содержимое параллельно обработал другой поток или процесс и файл под именем
+                # хеша уже есть - свою копию (сохранённую с суффиксом) удаляем, чтобы не осталась сиротой
+                default_storage.delete(saved)
+    return {'source': source_name, 'hash': digest, 'sizes': {str(size): name for size, name in names.items()}}
+
+
+def process_avatar(profile_id, source_name) -> None:
+    try:
+        variants = build_variants(source_name)
+        # update() вместо save(): без сигнала post_save и повторной постановки в очередь;
+        # условие по avatar - если за это время загрузили новый, результат не нужен
+        if Profile.objects.filter(pk=profile_id, avatar=source_name).update(avatar_variants=variants):
+            # без сигнала кэши сбрасываются здесь: в ответе профиля и у пользователя сессии был исходник
+            from accounts.profile_cache import invalidate_profiles  # profile_cache импортирует этот модуль
+            user_id, phone = Profile.objects.filter(pk=profile_id).values_list('user_id', 'user__phone').get()
+            forget_user(user_id)
+            invalidate_profiles(phone)
+    except Exception:
+        # в пуле исключение осело бы в Future, которого никто не ждёт; аватар остаётся исходником
+        logger.exception("Не удалось обработать аватар %s профиля %s", source_name, profile_id)
+
+
+def schedule_avatar(profile) -> None:
+    """Поставить обработку аватара в пул, если исходник ещё не обработан."""
+    if not profile.avatar or profile.avatar_variants.get('source') == profile.avatar.name:
+        return
+    if settings.AVATAR_PROCESS_ASYNC:
+        get_executor().submit(process_avatar, profile.pk, profile.avatar.name)
+    else:
+        process_avatar(profile.pk, profile.avatar.name)
+
+
+def avatar_url(profile, size=None) -> str:
+    """URL наименьшей миниатюры не меньше size (или самой большой), иначе исходника."""
+    size = size or settings.AVATAR_DEFAULT_SIZE
+    if sizes := profile.avatar_variants.get('sizes'):
+        fitting = sorted(int(num) for num in sizes if int(num) >= size) or [max(int(num) for num in sizes)]
+        return default_storage.url(sizes[str(fitting[0])])
+    if profile.avatar:
+        return profile.avatar.url
+    return "None"
+
+
+def absolute_avatar_url(request, profile, size=None) -> str | None:
+    """Полный URL миниатюры для ответов API; None - аватара нет."""
+    url = avatar_url(profile, size)
+    return request.build_absolute_uri(url) if url != "None" else None
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+from config import settings
+
+
+def user_cache_key(user_id) -> str:
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id) -> None:
+    """Сбросить закэшированного пользователя (выход, изменение пользователя или профиля)."""
+    caches[settings.SESSION_USER_CACHE].delete(user_cache_key(user_id))
+
+
+class CachedUserBackend(ModelBackend):
+    """
+    Аутентифицированный пользователь вместе с профилем (id, телефон, пригласительный код
+    и остальные поля) берётся из кэша, а не отдельным SELECT на каждый запрос.
+    Кэш сбрасывается сигналами при сохранении пользователя или профиля и при выходе.
+    """
+
+    def get_user(self, user_id):
+        cache = caches[settings.SESSION_USER_CACHE]
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = get_user_model()._default_manager.select_related('Profile').filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(key, user, timeout=settings.SESSION_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,32 @@
+"""Общие помощники для команд bench_*: замер времени и откат тестовых данных."""
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rollback():
+    """Всё, что создано внутри блока, откатывается - бенчмарк не портит базу."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def timed(func, count) -> float:
+    """Вызвать func(i) count раз, вернуть затраченное время в секундах."""
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return time.perf_counter() - start
+
+
+def rate(stdout, name, count, elapsed):
+    stdout.write(f"{name:<40} {count:>8} ops  {elapsed:8.3f} s  {count / elapsed:12.1f} ops/s")
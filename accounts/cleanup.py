@@ -0,0 +1,120 @@
+"""
+Пакетная очистка устаревших данных: истёкшие OTP в полях профиля, просроченные сессии и старые события.
+Строки выбираются пачками по ключу (время, первичный ключ) без OFFSET, каждая пачка -
+отдельная короткая транзакция; курсор пишется в файл контрольной точки.
+"""
+import datetime
+import json
+import os
+
+from django.contrib.sessions.models import Session
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import Profile, ProfileEvent
+from config import settings
+
+
+class Sweep:
+    """Строки старше границы (cutoff) по полю времени; fields - ключ курсора: (время, pk)."""
+    fields = ()
+
+    def cutoff(self) -> datetime.datetime:
+        raise NotImplementedError
+
+    def queryset(self, cutoff):
+        raise NotImplementedError
+
+    def apply(self, keys, cutoff) -> int:
+        """Очистить строки с этими pk, если они всё ещё старше cutoff. Возвращает число строк."""
+        raise NotImplementedError
+
+    def batch(self, cutoff, after, size):
+        """Следующая пачка после курсора after: (обработано строк, новый курсор или None - строк больше нет)."""
+        moment, key = self.fields
+        queryset = self.queryset(cutoff)
+        if after is not None:
+            queryset = queryset.filter(Q(**{f'{moment}__gt': after[0]}) | Q(**{moment: after[0], f'{key}__gt': after[1]}))
+        rows = list(queryset.order_by(moment, key).values_list(moment, key)[:size])
+        if not rows:
+            return 0, None
+        return self.apply([row[1] for row in rows], cutoff), rows[-1]
+
+
+class ExpiredOtp(Sweep):
+    """
+    Обнуляет otp/otptime/otpattempts. Граница - больше из OTP_LIFETIME и OTP_RETRY_TIMEOUT:
+    по otptime DbOtpStore ещё решает, можно ли выдать новый код. Идёт по индексу IX_profile_otptime.
+    """
+    fields = ('otptime', 'id')
+
+    def cutoff(self):
+        return timezone.now() - datetime.timedelta(seconds=max(settings.OTP_LIFETIME, settings.OTP_RETRY_TIMEOUT))
+
+    def queryset(self, cutoff):
+        return Profile.objects.filter(otptime__lt=cutoff)
+
+    def apply(self, keys, cutoff):
+        # повторное условие по времени: код, выданный заново после выборки, не трогаем.
+        # update() без сигналов: поля OTP в ответы профиля не входят, сбрасывать кэш незачем
+        return Profile.objects.filter(id__in=keys, otptime__lt=cutoff).update(otp=None, otptime=None, otpattempts=None)
+
+
+class ExpiredSessions(Sweep):
+    """Удаляет просроченные строки django_session (как clearsessions, но пачками)."""
+    fields = ('expire_date', 'session_key')
+
+    def cutoff(self):
+        return timezone.now()
+
+    def queryset(self, cutoff):
+        return Session.objects.filter(expire_date__lt=cutoff)
+
+    def apply(self, keys, cutoff):
+        # у Session нет связей и сигналов - delete() обходится одним DELETE
+        return Session.objects.filter(session_key__in=keys, expire_date__lt=cutoff).delete()[0]
+
+
+class ExpiredEvents(Sweep):
+    """Удаляет события ленты старше EVENTS_RETENTION_DAYS (по индексу IX_event_created)."""
+    fields = ('created', 'id')
+
+    def cutoff(self):
+        return timezone.now() - datetime.timedelta(days=settings.EVENTS_RETENTION_DAYS)
+
+    def queryset(self, cutoff):
+        return ProfileEvent.objects.filter(created__lt=cutoff)
+
+    def apply(self, keys, cutoff):
+        return ProfileEvent.objects.filter(id__in=keys).delete()[0]
+
+
+SWEEPS = {'otp': ExpiredOtp(), 'sessions': ExpiredSessions(), 'events': ExpiredEvents()}
+
+
+def load_checkpoint(path) -> dict:
+    """{имя: {'cutoff': ..., 'after': [время, pk]}} незавершённых проходов; {} - начинать заново."""
+    try:
+        with open(path, encoding='utf-8') as stream:
+            state = json.load(stream)
+    except FileNotFoundError:
+        return {}
+    for point in state.values():
+        point['cutoff'] = datetime.datetime.fromisoformat(point['cutoff'])
+        if point['after']:
+            point['after'] = [datetime.datetime.fromisoformat(point['after'][0]), point['after'][1]]
+    return state
+
+
+def save_checkpoint(path, state) -> None:
+    if not state:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    data = {name: {'cutoff': point['cutoff'].isoformat(),
+                   'after': [point['after'][0].isoformat(), point['after'][1]] if point['after'] else None}
+            for name, point in state.items()}
+    # через временный файл: прерывание посреди записи не оставит битую контрольную точку
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as stream:
+        json.dump(data, stream)
+    os.replace(f'{path}.tmp', path)
@@ -0,0 +1,145 @@
+import queue
+import random
+import threading
+import time
+
+from django.utils.module_loading import import_string
+
+from config import settings
+
+
+class ConsoleTransport:
+    """Заглушка SMS-шлюза: печатает сообщения пачкой."""
+
+    def send_batch(self, messages) -> None:
+        for phone, otp in messages:
+            print(f"===> You one time password {otp} must be send to {phone}")  # bung for this func
+
+
+class FakeTransport:
+    """Транспорт для тестов: запоминает пачки и может падать первые fail_times вызовов."""
+
+    def __init__(self, fail_times=0, delay=0):
+        self.fail_times = fail_times
+        self.delay = delay
+        self.batches = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def send_batch(self, messages) -> None:
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.fail_times:
+                raise ConnectionError('fake gateway is down')
+        if self.delay:
+            time.sleep(self.delay)
+        with self.lock:
+            self.batches.append(list(messages))
+
+    @property
+    def sent(self) -> list:
+        return [message for batch in self.batches for message in batch]
+
+
+class DeliveryQueue:
+    """
+    Ограниченная очередь отправки OTP. Обработчик запроса только кладёт сообщение
+    в очередь, пул потоков забирает их пачками до batch_size и отдаёт транспорту.
+    Неудачная пачка повторяется до retries раз с экспоненциальной задержкой и джиттером.
+    """
+
+    def __init__(self, transport, maxsize=1000, workers=2, batch_size=100,
+                 retries=3, backoff=0.5, put_timeout=0.05):
+        self.transport = transport
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.put_timeout = put_timeout
+        self.lock = threading.Lock()
+        self.metrics = {'enqueued': 0, 'dropped': 0, 'sent': 0, 'failed': 0,
+                        'batches': 0, 'retries': 0, 'max_depth': 0}
+        self.threads = [threading.Thread(target=self._worker, daemon=True, name=f'otp-delivery-{num}')
+                        for num in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def _count(self, name, value=1) -> None:
+        with self.lock:
+            self.metrics[name] += value
+
+    def enqueue(self, phone, otp, block=True) -> bool:
+        """
+        False - очередь переполнена и сообщение отброшено (backpressure).
+        block=False - не ждать места в очереди (для асинхронных обработчиков).
+        """
+        try:
+            self.queue.put((phone, otp), block=block, timeout=self.put_timeout)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        with self.lock:
+            self.metrics['enqueued'] += 1
+            self.metrics['max_depth'] = max(self.metrics['max_depth'], self.queue.qsize())
+        return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return self.metrics | {'depth': self.queue.qsize()}
+
+    def join(self) -> None:
+        """Дождаться отправки всего, что уже в очереди."""
+        self.queue.join()
+
+    def _next_batch(self) -> list:
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                self._send(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _send(self, batch) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                self.transport.send_batch(batch)
+            except Exception:
+                if attempt == self.retries:
+                    self._count('failed', len(batch))
+                    return
+                self._count('retries')
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            else:
+                self._count('batches')
+                self._count('sent', len(batch))
+                return
+
+
+_delivery_queue = None
+_delivery_lock = threading.Lock()
+
+
+def get_transport():
+    return import_string(settings.OTP_TRANSPORT)()
+
+
+def get_delivery_queue() -> DeliveryQueue:
+    global _delivery_queue
+    with _delivery_lock:
+        if _delivery_queue is None:
+            _delivery_queue = DeliveryQueue(get_transport(),
+                                            maxsize=settings.OTP_DELIVERY_QUEUE_SIZE,
+                                            workers=settings.OTP_DELIVERY_WORKERS,
+                                            batch_size=settings.OTP_DELIVERY_BATCH,
+                                            retries=settings.OTP_DELIVERY_RETRIES)
+        return _delivery_queue
@@ -0,0 +1,91 @@
+"""
+Лента событий профилей (transactional outbox): запись в транзакции изменения
+и чтение по курсору (id события) с долгим опросом.
+"""
+import datetime
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import ProfileEvent
+from config import settings
+
+# поля пользователя, изменение которых - событие PROFILE_CHANGED
+CONTACT_FIELDS = ('email', 'first_name', 'last_name')
+
+VERSION_KEY = 'events:ver'
+
+EVENT_VALUES = ('id', 'kind', 'phone', 'data', 'created')
+
+# ждущие чтения этого процесса; события других процессов видны по версии в кэше
+_new_events = threading.Condition()
+
+
+def append(kind, phone, **data) -> None:
+    """Записать событие в текущей транзакции; ждущих читателей разбудит её фиксация."""
+    if not settings.EVENTS_ENABLED:
+        return
+    ProfileEvent.objects.create(kind=kind, phone=phone, data=data)
+    transaction.on_commit(_published)
+
+
+def append_many(events) -> None:
+    """Пачка событий [(вид, номер, данные)] одним INSERT - для массовых операций."""
+    if not settings.EVENTS_ENABLED:
+        return
+    ProfileEvent.objects.bulk_create(ProfileEvent(kind=kind, phone=phone, data=data) for kind, phone, data in events)
+    transaction.on_commit(_published)
+
+
+def _published() -> None:
+    cache = caches[settings.EVENTS_CACHE]
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
+    with _new_events:
+        _new_events.notify_all()
+
+
+def read_events(after, limit) -> list:
+    """
+    События с id больше after по возрастанию. id выдаются при вставке, а видны после фиксации,
+    поэтому на пропуске в номерах, за которым событие моложе EVENTS_SETTLE_SECONDS, чтение
+    останавливается: пропущенный номер может принадлежать ещё не зафиксированной транзакции.
+    Старые пропуски - откаты, их проходим.
+    """
+    rows = ProfileEvent.objects.filter(id__gt=after).order_by('id').values(*EVENT_VALUES)[:limit]
+    settled = timezone.now() - datetime.timedelta(seconds=settings.EVENTS_SETTLE_SECONDS)
+    events, expected = [], after + 1
+    for row in rows:
+        if row['id'] != expected and row['created'] > settled:
+            break
+        events.append(row)
+        expected = row['id'] + 1
+    return events
+
+
+def wait_for_events(after, limit, timeout) -> list:
+    """
+    Долгий опрос: ждать до timeout секунд, пока появятся события после after.
+    Пока ничего не зафиксировано, база не читается - проверяется только версия в кэше
+    (и раз в EVENTS_SETTLE_SECONDS - на случай пропуска в номерах).
+    """
+    cache = caches[settings.EVENTS_CACHE]
+    deadline = time.monotonic() + timeout
+    while True:
+        version = cache.get(VERSION_KEY)
+        if (events := read_events(after, limit)) or time.monotonic() >= deadline:
+            return events
+        recheck = min(deadline, time.monotonic() + settings.EVENTS_SETTLE_SECONDS)
+        while cache.get(VERSION_KEY) == version and (now := time.monotonic()) < recheck:
+            with _new_events:
+                _new_events.wait(min(recheck - now, settings.EVENTS_POLL_SECONDS))
+
+
+def event_data(row) -> dict:
+    return {'seq': row['id'], 'kind': row['kind'], 'phone': row['phone'], 'data': row['data'],
+            'created': row['created'].isoformat()}
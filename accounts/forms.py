@@ -2,7 +2,7 @@ from django import forms
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
-from accounts.models import Profile
+from accounts.loaders import ProfileLoader
 
 
 class ProfileUserForm(forms.ModelForm):
@@ -13,8 +13,9 @@ class ProfileUserForm(forms.ModelForm):
     invited = forms.CharField(disabled=True, label="Код приглашения",
                               widget=forms.TextInput(attrs={'class': 'form-input'}), required=False)
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, loader=None, **kwargs):
         super(ProfileUserForm, self).__init__(*args, **kwargs)
+        self.loader = loader or ProfileLoader(self.instance.phone)
         if not self.initial.get('invited'):
             self.fields['invited'].disabled = False
 
@@ -22,12 +23,9 @@ class ProfileUserForm(forms.ModelForm):
         cleaned_data = super().clean()
         invited = cleaned_data.get('invited')
         if invited:
-            current_invite = Profile.objects.get(
-                user=get_user_model().objects.filter(phone=cleaned_data.get('phone')).first()).invite
-            if current_invite == invited:
+            if self.loader.invite == invited:
                 raise ValidationError('Нельзя приглашать самого себя!')
-            valid_invite = Profile.objects.filter(invite=invited)
-            if not valid_invite:
+            if not self.loader.invite_exists(invited):
                 raise ValidationError('Такого пригласительного не существует!')
 
     class Meta:
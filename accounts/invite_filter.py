@@ -0,0 +1,226 @@
+"""
+Проверка существования пригласительного кода без запроса в базу для заведомо несуществующих кодов.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Max
+
+from accounts.invites import ALPHABET, CODE_LENGTH
+from accounts.models import Profile
+from config import settings
+
+VERSION_KEY = 'invites:ver'
+
+_ALPHABET = frozenset(ALPHABET)
+
+
+def code_value(code):
+    """Код как число base36 (36^6 < 2^32 - помещается в 'I'); None - код не из алфавита."""
+    if len(code) != CODE_LENGTH or not _ALPHABET.issuperset(code):
+        return None
+    return int(code, 36)
+
+
+class InviteFilter:
+    """
+    Множество всех Profile.invite в памяти процесса: коды - отсортированный array('I'),
+    4 байта на код, поиск - bisect. Ответ "нет" точный и без базы; "да" - только
+    "возможно": код могли удалить в другом процессе, поэтому его подтверждает база.
+
+    Загружается при первой проверке. Свои новые коды процесс добавляет сразу (сигналы),
+    чужие - по версии в общем кэше (INVITE_FILTER_CACHE), которую каждый новый профиль
+    меняет: при несовпадении версии перед ответом "нет" дочитываются новые профили - один
+    запрос на смену версии, а не на каждую проверку. Раз в INVITE_FILTER_RESYNC_SECONDS
+    множество перечитывается целиком.
+
+    id выдаются при вставке, а видны после фиксации: профиль с меньшим id может появиться
+    позже уже прочитанного большего. Поэтому дочитываются id больше последнего, известного
+    INVITE_FILTER_SETTLE_SECONDS назад (см. horizon), а не больше последнего прочитанного.
+    Транзакции, шедшие во время загрузки, так не отследить: первые INVITE_FILTER_SETTLE_SECONDS
+    после загрузки "нет" после смены версии переспрашивается у базы.
+    """
+
+    def __init__(self, alias=None, resync_seconds=None, settle_seconds=None):
+        self.cache = caches[alias or settings.INVITE_FILTER_CACHE]
+        self.resync_seconds = resync_seconds or settings.INVITE_FILTER_RESYNC_SECONDS
+        self.settle_seconds = settings.INVITE_FILTER_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.codes = None  # None - ещё не загружено
+        self.added = set()  # добавленные после загрузки
+        self.removed = set()
+        self.other = set()  # коды не из алфавита (заведены вручную) - строками
+        self.last_id = 0
+        self.checkpoints = deque()  # (monotonic, last_id) после загрузок и дочитываний
+        self.version = None
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+        self.counters = {'lookups': 0, 'negatives': 0, 'loads': 0, 'syncs': 0}
+
+    def __contains__(self, code) -> bool:
+        value = code_value(code)
+        if value is None:
+            return code in self.other
+        if value in self.removed:
+            return False
+        codes = self.codes
+        index = bisect_left(codes, value)
+        return (index < len(codes) and codes[index] == value) or value in self.added
+
+    def might_exist(self, code) -> bool:
+        """False - такого кода точно нет; True - возможно есть, спросите базу."""
+        self.counters['lookups'] += 1
+        if self.codes is None or self.stale():
+            # загружает один поток, остальные тем временем идут в базу (или в прежнее множество)
+            if self.lock.acquire(blocking=False):
+                try:
+                    self.load()
+                finally:
+                    self.lock.release()
+            if self.codes is None:
+                return True
+        if code in self:
+            return True
+        if (version := self.cache.get(VERSION_KEY)) != self.version:
+            with self.lock:
+                if version is None:  # версия пропала из кэша - неизвестно, что пропущено
+                    self.load()
+                elif version != self.version:
+                    self.sync(version)
+            if code in self:
+                return True
+            if time.monotonic() - self.loaded_at < self.settle_seconds:
+                return True  # код мог прийти из транзакции, шедшей во время загрузки
+        self.counters['negatives'] += 1
+        return False
+
+    def stale(self) -> bool:
+        # добавленные по одному коды держатся в set - заметно дороже array, их вливает перезагрузка
+        return (time.monotonic() - self.loaded_at > self.resync_seconds
+                or len(self.added) > max(len(self.codes) // 10, 100000))
+
+    def build(self, rows) -> None:
+        """Заполнить по парам (id, код); коды желательно по возрастанию - тогда без сортировки."""
+        codes, other, last_id, ordered = array('I'), set(), 0, True
+        for pk, code in rows:
+            last_id = max(last_id, pk)
+            if (value := code_value(code)) is None:
+                other.add(code)
+                continue
+            ordered = ordered and (not codes or codes[-1] < value)
+            codes.append(value)
+        if not ordered:  # сортировка базы по invite не совпала с числовой
+            codes = array('I', sorted(codes))
+        # коды, добавленные сигналами во время загрузки, в выборку могли не попасть
+        added = {value for value in self.added if not self._in_array(codes, value)}
+        self.codes, self.other, self.added, self.removed = codes, other, added, set()
+        self.last_id = max(self.last_id, last_id)
+
+    @staticmethod
+    def _in_array(codes, value) -> bool:
+        index = bisect_left(codes, value)
+        return index < len(codes) and codes[index] == value
+
+    def load(self) -> None:
+        # версия и граница id - до чтения строк: всё, что появится позже, дочитает sync()
+        version = self.cache.get(VERSION_KEY)
+        last_id = Profile.objects.aggregate(last=Max('id'))['last'] or 0
+        # id не больше last_id уже выданы - к started + INVITE_FILTER_SETTLE_SECONDS все зафиксированы
+        started = time.monotonic()
+        rows = Profile.objects.order_by('invite').values_list('id', 'invite').iterator(chunk_size=10000)
+        self.last_id = 0
+        self.build(rows)
+        self.last_id = max(self.last_id, last_id)
+        self.checkpoints.append((started, last_id))
+        self.version = version
+        self.loaded_at = started
+        self.counters['loads'] += 1
+
+    def horizon(self) -> int:
+        """
+        Последний id, известный INVITE_FILTER_SETTLE_SECONDS назад: профили с меньшими id
+        уже зафиксированы (транзакции создания профиля короче этого времени) и прочитаны.
+        """
+        settled = time.monotonic() - self.settle_seconds
+        while len(self.checkpoints) > 1 and self.checkpoints[1][0] <= settled:
+            self.checkpoints.popleft()
+        return self.checkpoints[0][1] if self.checkpoints else 0
+
+    def sync(self, version) -> None:
+        # add() повторно прочитанных кодов ничего не меняет
+        for pk, code in Profile.objects.filter(id__gt=self.horizon()).values_list('id', 'invite').iterator():
+            self.add(code)
+            self.last_id = max(self.last_id, pk)
+        self.checkpoints.append((time.monotonic(), self.last_id))
+        self.version = version
+        self.counters['syncs'] += 1
+
+    def add(self, code) -> None:
+        if (value := code_value(code)) is None:
+            self.other.add(code)
+        else:
+            self.removed.discard(value)
+            if self.codes is None or not self._in_array(self.codes, value):
+                self.added.add(value)
+
+    def remove(self, code) -> None:
+        if (value := code_value(code)) is None:
+            self.other.discard(code)
+        else:
+            self.added.discard(value)
+            self.removed.add(value)
+
+    def stats(self) -> dict:
+        return self.counters | {'codes': len(self.codes or ()) + len(self.added) + len(self.other),
+                                'bytes': (self.codes or array('I')).buffer_info()[1] * 4}
+
+
+_invite_filter = None
+_invite_filter_lock = threading.Lock()
+
+
+def get_invite_filter() -> InviteFilter:
+    global _invite_filter
+    with _invite_filter_lock:
+        if _invite_filter is None:
+            _invite_filter = InviteFilter()
+        return _invite_filter
+
+
+def invite_exists(code) -> bool:
+    """Есть ли профиль с таким пригласительным кодом; в базу - только если фильтр не отсёк."""
+    if settings.INVITE_FILTER_ENABLED and not get_invite_filter().might_exist(code):
+        return False
+    return Profile.objects.filter(invite=code).exists()
+
+
+async def ainvite_exists(code) -> bool:
+    return await sync_to_async(invite_exists)(code)
+
+
+def invites_created(*codes) -> None:
+    """
+    Новые коды: сразу в множество этого процесса, а другим процессам - смена версии.
+    Версия меняется и сейчас, и после фиксации транзакции: процесс, дочитавший строки
+    до фиксации, не увидел бы их до следующей смены.
+    """
+    if _invite_filter is not None:
+        for code in codes:
+            _invite_filter.add(code)
+
+    def bump():
+        # новая версия - время в нс, как в ProfileResponseCache
+        caches[settings.INVITE_FILTER_CACHE].set(VERSION_KEY, time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invite_deleted(code) -> None:
+    if _invite_filter is not None:
+        transaction.on_commit(lambda: _invite_filter.remove(code))
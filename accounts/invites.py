@@ -0,0 +1,131 @@
+import hashlib
+import threading
+from string import ascii_lowercase, digits
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import F
+
+from accounts.models import InviteSequence, Profile
+from config import settings
+
+ALPHABET = digits + ascii_lowercase
+CODE_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+FEISTEL_ROUNDS = 4
+
+RESERVE_SQL = f"UPDATE {InviteSequence._meta.db_table} SET next_value = next_value + %s WHERE id = 1 RETURNING next_value"
+CREATE_SEQUENCE_SQL = f"INSERT INTO {InviteSequence._meta.db_table} (id, next_value) VALUES (1, 0) ON CONFLICT DO NOTHING"
+
+
+class InviteCodeAllocator:
+    """
+    Выдаёт пригласительные коды без коллизий. Номера берутся из общего счётчика
+    InviteSequence блоками по block_size на процесс и превращаются в код
+    ключевой перестановкой (сеть Фейстеля по 32 битам с cycle-walking до 36^6),
+    так что по одному коду нельзя угадать соседние. Выдача кода из готового
+    блока - просто pop() из списка.
+
+    Код часто выдаётся внутри транзакции (default поля Profile.invite, регистрация), а её
+    откат вернул бы счётчик назад, пока блок остаётся у процесса, - и следующий процесс
+    получил бы те же номера. Поэтому внутри транзакции блок резервируется отдельным
+    соединением в autocommit. Исключение - SQLite: там писатель один, и это сама внешняя
+    транзакция (отдельное соединение ждало бы её блокировку); номер резервируется в ней же
+    по одному и без блока - откат вернёт счётчик вместе с выданным кодом.
+    """
+
+    def __init__(self, key, block_size=500):
+        # раундовые функции - таблицы 2^16 -> 2^16 из потока SHAKE-256 по ключу
+        self.rounds = [memoryview(hashlib.shake_256(f'{key}:{num}'.encode()).digest(2 << 16)).cast('H')
+                       for num in range(FEISTEL_ROUNDS)]
+        self.block_size = block_size
+        self.codes = []
+        self.lock = threading.Lock()
+
+    def permute(self, value) -> int:
+        """Взаимно однозначное отображение [0, CODE_SPACE) на себя."""
+        while True:
+            left, right = value >> 16, value & 0xFFFF
+            for table in self.rounds:
+                left, right = right, left ^ table[right]
+            value = (left << 16) | right
+            if value < CODE_SPACE:
+                return value
+
+    @staticmethod
+    def encode(value) -> str:
+        chars = []
+        for _ in range(CODE_LENGTH):
+            value, rem = divmod(value, len(ALPHABET))
+            chars.append(ALPHABET[rem])
+        return ''.join(reversed(chars))
+
+    @staticmethod
+    def in_transaction_only() -> bool:
+        """Резерв возможен только в текущей транзакции (SQLite внутри atomic) - блок держать нельзя."""
+        return connection.in_atomic_block and connection.vendor == 'sqlite'
+
+    @staticmethod
+    def reserve(count) -> range:
+        if connection.in_atomic_block and connection.vendor != 'sqlite':
+            end = InviteCodeAllocator.reserve_separately(count)
+        else:
+            with transaction.atomic():
+                InviteSequence.objects.get_or_create(pk=1)
+                InviteSequence.objects.filter(pk=1).update(next_value=F('next_value') + count)
+                end = InviteSequence.objects.values_list('next_value', flat=True).get(pk=1)
+        if end > CODE_SPACE:
+            raise ValueError('Пространство пригласительных кодов исчерпано!')
+        return range(end - count, end)
+
+    @staticmethod
+    def reserve_separately(count) -> int:
+        """Сдвинуть счётчик через новое соединение в autocommit - вне транзакции вызывающего."""
+        separate = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            with separate.cursor() as cursor:
+                cursor.execute(RESERVE_SQL, [count])
+                if (row := cursor.fetchone()) is None:
+                    cursor.execute(CREATE_SEQUENCE_SQL)
+                    cursor.execute(RESERVE_SQL, [count])
+                    row = cursor.fetchone()
+            return row[0]
+        finally:
+            separate.close()
+
+    def codes_for(self, values) -> list:
+        """Коды для номеров без тех, что уже заняты (коды, выданные до появления счётчика)."""
+        codes = [self.encode(self.permute(value)) for value in values]
+        taken = set()
+        for offset in range(0, len(codes), 500):
+            taken.update(Profile.objects.filter(invite__in=codes[offset:offset + 500]).values_list('invite', flat=True))
+        return [code for code in codes if code not in taken]
+
+    def allocate(self) -> str:
+        with self.lock:
+            if not self.codes and self.in_transaction_only():
+                while not (codes := self.codes_for(self.reserve(1))):
+                    pass
+                return codes[0]
+            while not self.codes:
+                self.codes = self.codes_for(self.reserve(self.block_size))
+                self.codes.reverse()
+            return self.codes.pop()
+
+    def allocate_many(self, count) -> list:
+        """Отдельный блок ровно под count кодов - для массового импорта."""
+        codes = []
+        while len(codes) < count:
+            codes += self.codes_for(self.reserve(count - len(codes)))
+        return codes
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_invite_allocator() -> InviteCodeAllocator:
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = InviteCodeAllocator(settings.INVITE_CODE_KEY, settings.INVITE_CODE_BLOCK)
+        return _allocator
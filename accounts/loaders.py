@@ -0,0 +1,121 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils.functional import cached_property
+
+from accounts import invite_filter
+from accounts.avatars import avatar_url
+from accounts.models import Profile
+from config import settings
+
+
+class ProfileLoader:
+    """
+    Пользователь, профиль и последователи для одного номера телефона.
+    Пользователь с профилем читаются одним запросом (select_related),
+    последователи - вторым; всё запоминается до конца запроса.
+    """
+
+    def __init__(self, phone):
+        self.phone = phone
+
+    @cached_property
+    def user(self):
+        return get_user_model().objects.select_related('Profile').filter(phone=self.phone).first()
+
+    @cached_property
+    def profile(self) -> Profile | None:
+        try:
+            return self.user.Profile if self.user else None
+        except Profile.DoesNotExist:
+            return None
+
+    @property
+    def invite(self) -> str:
+        return self.profile.invite
+
+    @property
+    def invited(self) -> str:
+        return self.profile.invited
+
+    @property
+    def ava_url(self) -> str:
+        return avatar_url(self.profile)
+
+    @cached_property
+    def followers(self) -> list:
+        """Первая страница последователей, остальные - через /api/v1/followers/."""
+        return list(Profile.objects.filter(invited=self.invite).order_by('id')
+                    .values('user__phone')[:settings.FOLLOWERS_PAGE_SIZE])
+
+    @cached_property
+    def followers_count(self) -> int:
+        if len(self.followers) < settings.FOLLOWERS_PAGE_SIZE:
+            return len(self.followers)
+        return Profile.objects.filter(invited=self.invite).count()
+
+    @property
+    def follower_phones(self) -> list:
+        return [flw.get('user__phone') for flw in self.followers]
+
+    async def aload(self, followers=True) -> 'ProfileLoader':
+        """Заполнить пользователя, профиль и (по желанию) последователей асинхронными запросами."""
+        self.user = await get_user_model().objects.select_related('Profile').filter(phone=self.phone).afirst()
+        self.__dict__.pop('profile', None)
+        if followers and self.profile:
+            queryset = Profile.objects.filter(invited=self.invite)
+            self.followers = [row async for row in queryset.order_by('id').values('user__phone')
+                              [:settings.FOLLOWERS_PAGE_SIZE]]
+            if len(self.followers) < settings.FOLLOWERS_PAGE_SIZE:
+                self.followers_count = len(self.followers)
+            else:
+                self.followers_count = await queryset.acount()
+        return self
+
+    @staticmethod
+    def invite_exists(invite_code) -> bool:
+        return invite_filter.invite_exists(invite_code)
+
+
+def get_profile_loader(request) -> ProfileLoader:
+    """
+    Загрузчик профиля текущего пользователя, один на запрос. Если пользователь
+    пришёл из CachedUserBackend уже с профилем, запрос в базу за ними не нужен.
+    """
+    if not hasattr(request, '_profile_loader'):
+        loader = ProfileLoader(request.user.phone)
+        if get_user_model().Profile.is_cached(request.user):
+            loader.user = request.user
+        request._profile_loader = loader
+    return request._profile_loader
+
+
+def load_profiles(phones, with_followers=False) -> list:
+    """
+    Пользователи с профилями для пачки номеров: один запрос phone__in с JOIN профиля,
+    один подсчёт последователей, сгруппированный по invited, и с with_followers - один запрос
+    первых FOLLOWERS_PAGE_SIZE последователей каждого (ROW_NUMBER() по invited).
+    Возвращает [(номер, пользователь или None, телефоны последователей, их число)] в порядке phones.
+    """
+    users = {user.phone: user for user in get_user_model().objects.select_related('Profile')
+             .filter(phone__in=phones, Profile__isnull=False)}
+    codes = [user.Profile.invite for user in users.values()]
+    counts = dict(Profile.objects.filter(invited__in=codes).order_by().values_list('invited')
+                  .annotate(count=Count('id'))) if codes else {}
+    followers = defaultdict(list)
+    if with_followers and counts:
+        ranked = (Profile.objects.filter(invited__in=list(counts))
+                  .annotate(rank=Window(RowNumber(), partition_by=F('invited'), order_by=F('id').asc()))
+                  .filter(rank__lte=settings.FOLLOWERS_PAGE_SIZE)
+                  .order_by('invited', 'id').values_list('invited', 'user__phone'))
+        for invited, phone in ranked:
+            followers[invited].append(phone)
+    result = []
+    for phone in phones:
+        if user := users.get(phone):
+            result.append((phone, user, followers.get(user.Profile.invite, []), counts.get(user.Profile.invite, 0)))
+        else:
+            result.append((phone, None, [], 0))
+    return result
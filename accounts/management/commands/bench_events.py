@@ -0,0 +1,72 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounts import events
+from accounts.bench import timed, rate
+from accounts.models import ProfileEvent
+
+PHONE = '9500000000'
+
+
+class Command(BaseCommand):
+    help = ("Лента событий профилей: запись (по событию в транзакции и пачкой), чтение по курсору "
+            "страницами и задержка пробуждения долгого опроса. События прогона удаляются после него")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000)
+        parser.add_argument('--page', type=int, default=500)
+        parser.add_argument('--wakeups', type=int, default=50)
+
+    def handle(self, *args, **options):
+        count, page = options['events'], options['page']
+        start_id = ProfileEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        try:
+            def append(i):
+                with transaction.atomic():
+                    events.append(ProfileEvent.LOGIN, PHONE, num=i)
+
+            rate(self.stdout, 'append: событие в своей транзакции', count, timed(append, count))
+            with transaction.atomic():
+                start = time.perf_counter()
+                events.append_many((ProfileEvent.PROFILE_CHANGED, PHONE, {'num': i}) for i in range(count))
+            rate(self.stdout, 'append_many: одной пачкой', count, time.perf_counter() - start)
+
+            cursor, pages, read = start_id, 0, 0
+            start = time.perf_counter()
+            while rows := events.read_events(cursor, page):
+                cursor, pages, read = rows[-1]['id'], pages + 1, read + len(rows)
+            rate(self.stdout, f'read_events: страницы по {page}', read, time.perf_counter() - start)
+            self.stdout.write(f"  {pages} запросов, {read / pages:.0f} событий на запрос")
+
+            self.wakeups(cursor, options['wakeups'])
+        finally:
+            ProfileEvent.objects.filter(phone=PHONE, id__gt=start_id).delete()
+
+    def wakeups(self, cursor, rounds):
+        """Время от фиксации события до возврата из wait_for_events в другом потоке."""
+        delays = []
+        for _ in range(rounds):
+            result = {}
+
+            def wait():
+                try:
+                    result['rows'] = events.wait_for_events(cursor, 10, 5)
+                    result['at'] = time.perf_counter()
+                finally:
+                    connection.close()
+
+            waiter = threading.Thread(target=wait)
+            waiter.start()
+            time.sleep(0.01)  # ждущий успевает прочитать пустую ленту
+            committed = time.perf_counter()
+            with transaction.atomic():
+                events.append(ProfileEvent.LOGIN, PHONE)
+            waiter.join()
+            delays.append(result['at'] - committed)
+            cursor = result['rows'][-1]['id']
+        self.stdout.write(f"долгий опрос: пробуждение после фиксации - медиана {statistics.median(delays) * 1000:.1f} ms, "
+                          f"максимум {max(delays) * 1000:.1f} ms ({rounds} раз)")
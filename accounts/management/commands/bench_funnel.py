@@ -0,0 +1,182 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases
+
+from accounts.delivery import ConsoleTransport
+from accounts.invites import get_invite_allocator
+from accounts.models import Profile
+from accounts.referrals import rebuild_follower_counters
+from config import settings
+
+PHONE_BASE = 9600000000
+
+
+class RecordingTransport(ConsoleTransport):
+    """Транспорт прогона: коды не печатаются, а запоминаются, чтобы HTML-сценарий мог их ввести."""
+    codes = {}
+
+    def send_batch(self, batch) -> None:
+        for phone, otp in batch:
+            self.codes[str(phone)] = otp
+
+
+class Command(BaseCommand):
+    help = ("Прогон всей воронки входа тестовым клиентом в несколько потоков: API (login -> login/<phone> -> "
+            "profile) и HTML-страницы (/ -> /otp/<phone>/ -> /profile/). Пользователи засеваются деревом "
+            "приглашений в отдельной тестовой базе (как у manage.py test), которая удаляется после прогона; "
+            "ключи кэшей - с префиксом bench_funnel. Итог - JSON: пропускная способность, p50/p95/p99 и "
+            "SQL-запросов на шаг. СУБД - из настроек: SQLite по умолчанию, PostgreSQL при POSTGRES_DB "
+            "(нужно право CREATE DATABASE).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help="засеять пользователей")
+        parser.add_argument('--sessions', type=int, default=1000, help="пройти воронку раз")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--new-share', type=float, default=0.3, help="доля сессий с регистрацией")
+        parser.add_argument('--html-share', type=float, default=0.3, help="доля сессий через HTML-страницы")
+        parser.add_argument('--output', help="записать JSON в файл (иначе - в stdout)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.samples = defaultdict(list)  # шаг: [(секунды, SQL-запросов, ожидаемый ли статус)]
+        self.lock = threading.Lock()
+        # рабочие данные не трогаем: своя база и свои ключи в кэшах (в общем кэше пользователи
+        # тестовой базы совпали бы по id с настоящими)
+        databases = setup_databases(verbosity=0, interactive=False)
+        caches_config = {alias: config | {'KEY_PREFIX': 'bench_funnel'}
+                         for alias, config in django_settings.CACHES.items()}
+        try:
+            with override_settings(CACHES=caches_config), ExitStack() as stack:
+                seed_elapsed = self.seed(options['users'])
+                sessions = self.plan(options)
+                # прогон меряет приложение, а не лимиты и SMS-шлюз
+                stack.enter_context(mock.patch.object(settings, 'RATELIMITS', {'otp_issue': {}, 'otp_verify': {}}))
+                stack.enter_context(mock.patch.object(settings, 'OTP_DELIVERY_ASYNC', False))
+                stack.enter_context(mock.patch.object(
+                    settings, 'OTP_TRANSPORT', f'{__name__}.RecordingTransport'))
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                    list(executor.map(self.run_session, sessions))
+                elapsed = time.perf_counter() - start
+        finally:
+            teardown_databases(databases, verbosity=0)
+        report = self.report(options, seed_elapsed, len(sessions), elapsed)
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(text + '\n')
+        self.stdout.write(text)
+
+    def seed(self, count, batch_size=5000) -> float:
+        """Случайное дерево: каждый следующий приглашён одним из предыдущих, треть - без приглашения."""
+        start = time.perf_counter()
+        self.invites = get_invite_allocator().allocate_many(count)
+        for offset in range(0, count, batch_size):
+            users = get_user_model().objects.bulk_create(
+                get_user_model()(phone=str(PHONE_BASE + num), password=UNUSABLE_PASSWORD_PREFIX)
+                for num in range(offset, min(offset + batch_size, count)))
+            Profile.objects.bulk_create(
+                Profile(user=user, invite=self.invites[num],
+                        invited=self.invites[self.rng.randrange(num)] if num and self.rng.random() > 0.3 else None)
+                for num, user in enumerate(users, start=offset))
+        rebuild_follower_counters()
+        return time.perf_counter() - start
+
+    def plan(self, options) -> list:
+        """Сессии заранее: (вход через HTML?, телефон, пригласительный код для регистрации)."""
+        returning = self.rng.sample(range(options['users']), k=min(options['users'], options['sessions']))
+        sessions = []
+        for num in range(options['sessions']):
+            html = self.rng.random() < options['html_share']
+            if self.rng.random() < options['new_share'] or num >= len(returning):
+                invited = self.rng.choice(self.invites) if self.invites else None
+                sessions.append((html, str(PHONE_BASE + 50000000 + num), invited))
+            else:
+                sessions.append((html, str(PHONE_BASE + returning[num]), None))
+        return sessions
+
+    def step(self, name, call, expected=200):
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            start = time.perf_counter()
+            response = call()
+            elapsed = time.perf_counter() - start
+        ok = response.status_code == expected
+        with self.lock:
+            self.samples[name].append((elapsed, sum(len(capture) for capture in captured), ok))
+        return response
+
+    def run_session(self, session):
+        try:
+            self.walk(session)
+        finally:
+            # соединения потоков пула - до удаления тестовой базы (PostgreSQL не удалит базу с открытыми)
+            connections.close_all()
+
+    def walk(self, session):
+        html, phone, invited = session
+        client = Client(HTTP_HOST='localhost')
+        if html:
+            self.step('html GET /', lambda: client.get('/'))
+            self.step('html POST /', lambda: client.post('/', {'phone': phone, 'invited': invited or ''}), 302)
+            otp = RecordingTransport.codes.get(phone, 0)
+            self.step('html POST /otp/<phone>/', lambda: client.post(f'/otp/{phone}/', {'otp': otp}), 302)
+            self.step('html GET /profile/', lambda: client.get('/profile/'))
+        else:
+            self.step('api login', lambda: client.post(
+                '/api/v1/login/', {'phone': phone}, content_type='application/json'))
+            otp = RecordingTransport.codes.get(phone, 0)
+            self.step('api login/<phone>', lambda: client.post(
+                f'/api/v1/login/{phone}/', {'otp': otp}, content_type='application/json'))
+            self.step('api profile', lambda: client.post(
+                '/api/v1/profile/', {'phone': phone}, content_type='application/json'))
+
+    def report(self, options, seed_elapsed, sessions, elapsed) -> dict:
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                    text=True, cwd=settings.BASE_DIR).stdout.strip() or None
+        except OSError:
+            commit = None
+        steps = {}
+        for name, samples in sorted(self.samples.items()):
+            latencies = sorted(sample[0] for sample in samples)
+            quantiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 \
+                else latencies * 99
+            steps[name] = {
+                'requests': len(samples),
+                'errors': sum(not sample[2] for sample in samples),
+                'p50_ms': round(quantiles[49] * 1000, 2),
+                'p95_ms': round(quantiles[94] * 1000, 2),
+                'p99_ms': round(quantiles[98] * 1000, 2),
+                'queries_per_request': round(statistics.mean(sample[1] for sample in samples), 2),
+            }
+        return {
+            'commit': commit,
+            'database': connection.vendor,
+            'otp_store': settings.OTP_STORE,
+            'api_async': settings.API_ASYNC,
+            'users': options['users'],
+            'concurrency': options['concurrency'],
+            'seed_s': round(seed_elapsed, 2),
+            'sessions': sessions,
+            'elapsed_s': round(elapsed, 2),
+            'sessions_per_s': round(sessions / elapsed, 1),
+            'requests_per_s': round(sum(len(samples) for samples in self.samples.values()) / elapsed, 1),
+            'steps': steps,
+        }
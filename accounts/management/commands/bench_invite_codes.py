@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.bench import rollback, timed, rate
+from accounts.invites import InviteCodeAllocator, CODE_SPACE
+from config import settings
+
+
+class Command(BaseCommand):
+    help = "Микробенчмарк выдачи пригласительных кодов: перестановка, заполнение блоков, выдача из блока"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codes', type=int, default=200000)
+        parser.add_argument('--block', type=int, default=settings.INVITE_CODE_BLOCK)
+
+    def handle(self, *args, **options):
+        count = options['codes']
+        allocator = InviteCodeAllocator(settings.INVITE_CODE_KEY, options['block'])
+        rate(self.stdout, 'permute + encode', count,
+             timed(lambda i: allocator.encode(allocator.permute(i)), count))
+        with rollback():
+            start = time.perf_counter()
+            codes = allocator.allocate_many(count)
+            rate(self.stdout, 'allocate_many (массовый импорт)', count, time.perf_counter() - start)
+            assert len(set(codes)) == count
+
+            start = time.perf_counter()
+            allocator.codes = allocator.allocate_many(count)
+            prepared = time.perf_counter() - start
+            rate(self.stdout, 'allocate из готового блока', count, timed(lambda i: allocator.allocate(), count))
+            self.stdout.write(f"  подготовка блока: {prepared:.3f} s; занято {count * 2 / CODE_SPACE:.6%} пространства")
+
+        # вне транзакции блоки резервируются в autocommit и не откатываются - счётчик просто уйдёт вперёд
+        allocator.codes = []
+        rate(self.stdout, f'allocate с резервированием по {options["block"]}', count,
+             timed(lambda i: allocator.allocate(), count))
+        # внутри транзакции блок резервирует отдельное соединение, на SQLite - по одному номеру без блока
+        inside = min(count, 10000)
+        with rollback():
+            allocator.codes = []
+            rate(self.stdout, 'allocate внутри транзакции', inside, timed(lambda i: allocator.allocate(), inside))
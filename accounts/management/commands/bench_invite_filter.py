@@ -0,0 +1,57 @@
+import math
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.bench import rollback, timed, rate
+from accounts.invite_filter import InviteFilter, VERSION_KEY
+from accounts.invites import InviteCodeAllocator, CODE_SPACE
+from accounts.models import Profile
+
+
+class Command(BaseCommand):
+    help = ("Множество пригласительных кодов в памяти (InviteFilter): память и время построения на --codes "
+            "кодах, скорость проверки несуществующих и существующих кодов в сравнении с запросом в базу")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codes', type=int, default=10_000_000)
+        parser.add_argument('--lookups', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=5000, help="проверок запросом в базу для сравнения")
+
+    def handle(self, *args, **options):
+        count, lookups = options['codes'], options['lookups']
+        rng = random.Random(0)
+        start = time.perf_counter()
+        values = sorted(rng.sample(range(CODE_SPACE), count))
+        # строки по возрастанию - как их отдаёт ORDER BY invite
+        rows = [(pk, InviteCodeAllocator.encode(value)) for pk, value in enumerate(values, start=1)]
+        self.stdout.write(f"подготовка {count} кодов: {time.perf_counter() - start:.1f} s")
+
+        invites = InviteFilter()
+        start = time.perf_counter()
+        invites.build(rows)
+        self.stdout.write(f"построение: {time.perf_counter() - start:.2f} s")
+        stats = invites.stats()
+        bloom = -count * math.log(0.01) / math.log(2) ** 2 / 8
+        self.stdout.write(f"память: {stats['bytes'] / 2 ** 20:.1f} МиБ, {stats['bytes'] / count:.1f} байт на код "
+                          f"(фильтр Блума с 1% ложных срабатываний - {bloom / 2 ** 20:.1f} МиБ)")
+
+        existing = [rows[rng.randrange(count)][1] for _ in range(lookups)]
+        bogus = [InviteCodeAllocator.encode(rng.randrange(CODE_SPACE)) for _ in range(lookups)]
+        del rows, values
+        rate(self.stdout, 'in: существующие коды', lookups, timed(lambda i: existing[i] in invites, lookups))
+        rate(self.stdout, 'in: случайные коды', lookups, timed(lambda i: bogus[i] in invites, lookups))
+        # проверка целиком: с версией в кэше (одно обращение к кэшу на ответ "нет")
+        invites.version, invites.loaded_at = invites.cache.get(VERSION_KEY), time.monotonic()
+        rate(self.stdout, 'might_exist: случайные коды', lookups, timed(lambda i: invites.might_exist(bogus[i]), lookups))
+        negatives = sum(not invites.might_exist(code) for code in bogus)
+        self.stdout.write(f"  отсечено без базы: {negatives / lookups:.2%} случайных кодов")
+
+        queries = options['queries']
+        with rollback():
+            user = get_user_model().objects.create_user('9000000000')
+            Profile.objects.bulk_create([Profile(user=user, invite='000000')])
+            rate(self.stdout, 'для сравнения: exists() в базе', queries,
+                 timed(lambda i: Profile.objects.filter(invite=bogus[i]).exists(), queries))
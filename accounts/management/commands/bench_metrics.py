@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from accounts.bench import rollback, timed, rate
+from config import settings
+
+
+class Command(BaseCommand):
+    help = ("Накладные расходы MetricsMiddleware: одни и те же запросы через тестовый клиент "
+            "с метриками и без (кэшированный ответ профиля - худший случай, список последователей - с SQL)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--rounds', type=int, default=3)
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        without = [name for name in settings.MIDDLEWARE if name != 'accounts.metrics.MetricsMiddleware']
+        with rollback():
+            inviter = get_user_model().objects.create_phone_user('9000000000')
+            for num in range(1, 21):
+                get_user_model().objects.create_phone_user(str(9000000000 + num), invited=inviter.Profile.invite)
+            requests = {
+                'POST /api/v1/profile/ (кэш)': lambda client: client.post(
+                    '/api/v1/profile/', {'phone': '9000000000'}, content_type='application/json'),
+                'GET /api/v1/followers/': lambda client: client.get('/api/v1/followers/9000000000/'),
+            }
+            for name, request in requests.items():
+                clients = {}
+                for label, middleware in (('без метрик', without), ('с метриками', settings.MIDDLEWARE)):
+                    with override_settings(MIDDLEWARE=middleware):
+                        clients[label] = Client(HTTP_HOST='localhost')
+                        request(clients[label])  # загрузка middleware и прогрев кэша
+                # прогоны чередуются, берётся лучший: так меньше влияние шума и порядка запуска
+                best = {label: float('inf') for label in clients}
+                for _ in range(options['rounds']):
+                    for label, client in clients.items():
+                        best[label] = min(best[label], timed(lambda i: request(client), count))
+                for label, elapsed in best.items():
+                    rate(self.stdout, f'{name} {label}', count, elapsed)
+                overhead = best['с метриками'] / best['без метрик'] - 1
+                self.stdout.write(f"{name}: накладные расходы {overhead * 100:+.1f}%")
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from accounts.bench import rollback, timed, rate
+from accounts.models import Profile
+from accounts.otp_store import DbOtpStore, CacheOtpStore, TotpOtpStore
+
+
+class Command(BaseCommand):
+    help = ("Сравнение пропускной способности выдачи и проверки OTP для DbOtpStore, CacheOtpStore "
+            "и TotpOtpStore: операций в секунду, SQL-запросов (из них записей) на операцию, мкс на попытку")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = options['users']
+        phones = [str(9000000000 + i) for i in range(count)]
+        with rollback():
+            users = get_user_model().objects.bulk_create(get_user_model()(phone=phone) for phone in phones)
+            Profile.objects.bulk_create(Profile(user=user, invite=f'b{i:05}') for i, user in enumerate(users))
+            for store in (DbOtpStore(), CacheOtpStore(), TotpOtpStore()):
+                self.forget(store, phones)
+                codes = {}
+                name = type(store).__name__
+                queries = QueryCounter()
+                with connection.execute_wrapper(queries):
+                    elapsed = timed(lambda i: codes.__setitem__(phones[i], store.issue(phones[i])), count)
+                rate(self.stdout, f'{name}.issue', count, elapsed)
+                self.queries(queries, count)
+                # неверная попытка, затем верная: обе списывают попытку
+                queries = QueryCounter()
+                with connection.execute_wrapper(queries):
+                    elapsed = timed(lambda i: (store.verify(phones[i], codes[phones[i]] + 1),
+                                               store.verify(phones[i], codes[phones[i]])), count)
+                rate(self.stdout, f'{name}.verify', count * 2, elapsed)
+                self.queries(queries, count * 2)
+                self.stdout.write(f"{'':<40} {elapsed / (count * 2) * 1e6:.1f} мкс на попытку")
+                self.forget(store, phones)
+
+    @staticmethod
+    def forget(store, phones):
+        if isinstance(store, CacheOtpStore):
+            store.cache.delete_many([key for phone in phones for key in store._keys(phone)])
+        elif isinstance(store, TotpOtpStore):
+            step = store.step()
+            store.cache.delete_many([key for phone in phones for past in (step - 1, step)
+                                     for key in store._keys(phone, past)])
+
+    def queries(self, queries, count):
+        self.stdout.write(f"{'':<40} {queries.total / count:.2f} SQL на операцию, "
+                          f"из них записей {queries.writes / count:.2f}")
+
+
+class QueryCounter:
+    """Обёртка connection.execute_wrapper: считает запросы без журнала CaptureQueriesContext."""
+
+    def __init__(self):
+        self.total = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        self.writes += not sql.lstrip().upper().startswith('SELECT')
+        return execute(sql, params, many, context)
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.forms import model_to_dict
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from accounts.bench import rollback, timed, rate
+from accounts.models import Profile
+from accounts.serializers import ProfileOut
+
+
+class ValidatingOutSerializer(serializers.Serializer):
+    """Прежний способ ответа: данные из базы прогонялись через проверку полей ради validated_data."""
+    user = serializers.CharField(write_only=True)
+    phone = serializers.CharField(write_only=True)
+    email = serializers.EmailField(allow_blank=True, allow_null=True, required=False)
+    first_name = serializers.CharField(allow_blank=True, allow_null=True, required=False)
+    last_name = serializers.CharField(allow_blank=True, allow_null=True, required=False)
+    invite = serializers.CharField(write_only=True)
+    invited = serializers.CharField(allow_null=True, allow_blank=True)
+    followers = serializers.JSONField(write_only=True)
+    followers_count = serializers.IntegerField(write_only=True)
+    avatar_url = serializers.CharField(allow_null=True, write_only=True)
+
+
+class Command(BaseCommand):
+    help = ("Затраты CPU на сборку ответа API профиля: model_to_dict + проверяющий сериализатор "
+            "против ProfileOut (без запросов к базе, только построение и рендер JSON)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count, requests = options['followers'], options['requests']
+        renderer = JSONRenderer()
+        with rollback():
+            owner = get_user_model().objects.create(phone='9000000000', email='owner@example.com',
+                                                    first_name='Иван', last_name='Петров')
+            profile = Profile.objects.create(user=owner, invite='bench0')
+            users = get_user_model().objects.bulk_create(
+                get_user_model()(phone=str(9000000001 + num)) for num in range(count))
+            Profile.objects.bulk_create(Profile(user=user, invite=f'b{num:05}', invited='bench0')
+                                        for num, user in enumerate(users))
+            followers = list(Profile.objects.filter(invited='bench0').values_list('user__phone', flat=True))
+
+            def validating(_):
+                merged_data = model_to_dict(owner) | model_to_dict(profile) | {
+                    'phone': str(owner), 'followers': followers, 'followers_count': count, 'avatar_url': None}
+                out = ValidatingOutSerializer(data=merged_data)
+                out.is_valid()
+                renderer.render(out.validated_data)
+
+            def direct(_):
+                renderer.render(ProfileOut.from_instances(owner, profile, followers, count).data)
+
+            results = {}
+            for name, func in (('model_to_dict + serializer', validating),
+                               ('ProfileOut.from_instances', direct)):
+                results[name] = timed(func, requests)
+                rate(self.stdout, name, requests, results[name])
+            saved = (results['model_to_dict + serializer'] - results['ProfileOut.from_instances']) / requests
+            self.stdout.write(f"{count} подписчиков: экономия {saved * 1e6:.1f} мкс CPU на запрос")
@@ -0,0 +1,48 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.bench import rollback, timed, rate
+from accounts.models import Profile
+from accounts.referrals import attach_follower, referral_subtree, rebuild_follower_counters
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк дерева приглашений: пересчёт счётчиков, выборка поддерева, инкрементальное обновление"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=100000, help="для полного прогона: 1000000")
+        parser.add_argument('--depth', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count, batch_size = options['profiles'], options['batch_size']
+        random.seed(0)
+        with rollback():
+            start = time.perf_counter()
+            invites = [f'{num:06x}' for num in range(count)]
+            for offset in range(0, count, batch_size):
+                users = get_user_model().objects.bulk_create(
+                    get_user_model()(phone=str(9000000000 + num)) for num in range(offset, min(offset + batch_size, count)))
+                # каждый следующий профиль приглашён одним из предыдущих - получается случайное дерево
+                Profile.objects.bulk_create(
+                    Profile(user=user, invite=invites[num], invited=invites[random.randrange(num)] if num else None)
+                    for num, user in enumerate(users, start=offset))
+            rate(self.stdout, 'seed profiles', count, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            rebuild_follower_counters(batch_size)
+            rate(self.stdout, 'rebuild_follower_counters', count, time.perf_counter() - start)
+
+            queries = options['queries']
+            roots = [invites[random.randrange(min(count, 1000))] for _ in range(queries)]
+            rows = []
+            elapsed = timed(lambda i: rows.append(len(referral_subtree(roots[i], options['depth']))), queries)
+            rate(self.stdout, f'referral_subtree depth={options["depth"]}', queries, elapsed)
+            self.stdout.write(f"  в среднем узлов в поддереве: {sum(rows) / queries:.0f}")
+
+            leaf = Profile(invite='zzzzzz', invited=invites[-1])
+            rate(self.stdout, 'attach_follower (лист)', queries, timed(lambda i: attach_follower(leaf), queries))
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.bench import rollback, timed, rate
+from accounts.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Регистраций в секунду на одно ядро: старые пути создания пользователя и create_phone_user"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=1000)
+        parser.add_argument('--hashed', type=int, default=20, help="регистраций с хешированием пароля (PBKDF2)")
+
+    def handle(self, *args, **options):
+        count = options['signups']
+        users = get_user_model().objects
+
+        def create_with_hash(i):
+            Profile.objects.create(user=users.create_user(str(9100000000 + i), password='secret'))
+
+        def create_as_views(i):  # как было во views: две отдельные вставки
+            Profile.objects.create(user=users.create(phone=str(9200000000 + i)))
+
+        def create_phone_user(i):
+            users.create_phone_user(str(9300000000 + i))
+
+        with rollback():
+            rate(self.stdout, 'create_user(password) + Profile', options['hashed'],
+                 timed(create_with_hash, options['hashed']))
+            rate(self.stdout, 'objects.create + Profile (views)', count, timed(create_as_views, count))
+            rate(self.stdout, 'create_phone_user', count, timed(create_phone_user, count))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.cleanup import SWEEPS, load_checkpoint, save_checkpoint
+from config import settings
+
+
+class Command(BaseCommand):
+    help = ("Очистка истёкших OTP в профилях, просроченных сессий и старых событий ленты пачками "
+            "по --batch-size строк с паузой --sleep между ними. После прерывания продолжает с контрольной точки; "
+            "с --loop повторяет проход раз в --interval секунд")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.CLEANUP_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=settings.CLEANUP_SLEEP, help="пауза между пачками, s")
+        parser.add_argument('--checkpoint', default=str(settings.CLEANUP_CHECKPOINT))
+        parser.add_argument('--only', choices=SWEEPS, action='append', help="только эта очистка (можно повторить)")
+        parser.add_argument('--loop', action='store_true', help="не завершаться, а повторять проход")
+        parser.add_argument('--interval', type=float, default=settings.CLEANUP_INTERVAL, help="между проходами, s")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                self.run_pass(options)
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(f"Прервано, продолжение - с контрольной точки {options['checkpoint']}")
+
+    def run_pass(self, options):
+        path = options['checkpoint']
+        state = load_checkpoint(path)
+        for name in options['only'] or SWEEPS:
+            sweep = SWEEPS[name]
+            # продолжение прерванного прохода - с той же границей, иначе - новая
+            point = state.setdefault(name, {'cutoff': sweep.cutoff(), 'after': None})
+            if point['after']:
+                self.stdout.write(f"{name}: продолжение после {point['after'][1]}")
+            rows, batches, start = 0, 0, time.perf_counter()
+            while True:
+                count, point['after'] = sweep.batch(point['cutoff'], point['after'], options['batch_size'])
+                if point['after'] is None:
+                    break
+                rows += count
+                batches += 1
+                save_checkpoint(path, state)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  {name}: +{count}, курсор {point['after'][1]}")
+                time.sleep(options['sleep'])
+            del state[name]
+            save_checkpoint(path, state)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{name}: {rows} строк, {batches} пачек за {elapsed:.2f} s "
+                              f"({rows / elapsed:.0f} строк/s)")
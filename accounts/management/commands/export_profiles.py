@@ -0,0 +1,37 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Profile
+
+FIELDS = ('phone', 'email', 'first_name', 'last_name', 'invite', 'invited', 'followers_direct', 'followers_total')
+COLUMNS = ('user__phone', 'user__email', 'user__first_name', 'user__last_name',
+           'invite', 'invited', 'followers_direct', 'followers_total')
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка пользователей с профилями в CSV/JSONL; память не растёт с размером таблицы"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="файл или '-' для stdout")
+        parser.add_argument('--format', choices=('csv', 'jsonl'))
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        stream = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        rows = Profile.objects.order_by('id').values_list(*COLUMNS).iterator(chunk_size=options['chunk_size'])
+        try:
+            if fmt == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(FIELDS)
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    stream.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n')
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
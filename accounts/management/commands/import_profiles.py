@@ -0,0 +1,130 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from accounts.events import append_many
+from accounts.invite_filter import invites_created
+from accounts.invites import get_invite_allocator
+from accounts.models import Profile, ProfileEvent
+from accounts.profile_cache import invalidate_profiles
+from accounts.referrals import rebuild_follower_counters
+from accounts.utils import phone_regex
+
+USER_FIELDS = ('email', 'first_name', 'last_name')
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = ("Массовый импорт пользователей с профилями из CSV/JSONL (поля phone, email, first_name, last_name, invited). "
+            "Уже существующие телефоны и некорректные номера пропускаются, неизвестные пригласительные обнуляются.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="файл или '-' для stdin")
+        parser.add_argument('--format', choices=('csv', 'jsonl'))
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--skip-counters', action='store_true',
+                            help="не пересчитывать счётчики последователей после импорта")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        # все существующие коды - один раз в память; новых профилей в файле ещё нет в базе
+        self.invites = set(Profile.objects.values_list('invite', flat=True).iterator())
+        self.seen = set()
+        self.stats = {'created': 0, 'bad_phone': 0, 'duplicate': 0, 'bad_invite': 0}
+        start = time.perf_counter()
+        try:
+            rows = read_rows(stream, fmt)
+            while chunk := list(islice(rows, options['chunk_size'])):
+                chunk_start = time.perf_counter()
+                created = self.import_chunk(chunk)
+                elapsed = time.perf_counter() - chunk_start
+                self.stdout.write(f"  +{created} за {elapsed:.2f} s ({len(chunk) / elapsed:.0f} строк/s)")
+        except (ValueError, KeyError) as err:
+            raise CommandError(f'Ошибка чтения файла: {err}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        if self.stats['created'] and not options['skip_counters']:
+            rebuild_follower_counters()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Готово за {elapsed:.2f} s ({self.stats['created'] / elapsed:.0f} профилей/s): {self.stats}")
+
+    def import_chunk(self, chunk) -> int:
+        rows = []
+        for row in chunk:
+            phone = str(row.get('phone') or '').strip()
+            if not phone_regex.regex.match(phone):
+                self.stats['bad_phone'] += 1
+            elif phone in self.seen:
+                self.stats['duplicate'] += 1
+            else:
+                self.seen.add(phone)
+                rows.append(row | {'phone': phone})
+        existing = set(get_user_model().objects.filter(phone__in=[row['phone'] for row in rows])
+                       .values_list('phone', flat=True))
+        self.stats['duplicate'] += len(existing)
+        rows = [row for row in rows if row['phone'] not in existing]
+        if not rows:
+            return 0
+        for row in rows:
+            if row.get('invited') and row['invited'] not in self.invites:
+                self.stats['bad_invite'] += 1
+                row['invited'] = None
+
+        invites = get_invite_allocator().allocate_many(len(rows))  # вне транзакции, см. InviteCodeAllocator
+        while True:
+            try:
+                users, profiles = self.insert(rows, invites)
+                break
+            except IntegrityError as err:
+                # номер успели зарегистрировать между проверкой и вставкой - пропускаем его
+                # и повторяем пачку; остальные пачки импорта это не задевает
+                taken = set(get_user_model().objects.filter(phone__in=[row['phone'] for row in rows])
+                            .values_list('phone', flat=True))
+                if not taken:
+                    raise CommandError(f'Ошибка записи пачки: {err}')
+                self.stats['duplicate'] += len(taken)
+                rows = [row for row in rows if row['phone'] not in taken]
+                if not rows:
+                    return 0
+        # bulk_create не шлёт post_save: кэш ответов пригласивших сбрасываем сами
+        inviter_codes = {profile.invited for profile in profiles if profile.invited}
+        invalidate_profiles(*get_user_model().objects.filter(Profile__invite__in=inviter_codes)
+                            .values_list('phone', flat=True))
+        invites_created(*(profile.invite for profile in profiles))
+        self.invites.update(profile.invite for profile in profiles)
+        self.stats['created'] += len(profiles)
+        return len(profiles)
+
+    @staticmethod
+    def insert(rows, invites) -> tuple:
+        with transaction.atomic():
+            users = get_user_model().objects.bulk_create(
+                # вход только по OTP: пароль заведомо непригоден, без хеширования
+                get_user_model()(phone=row['phone'], password=UNUSABLE_PASSWORD_PREFIX,
+                                 **{field: row.get(field) or '' for field in USER_FIELDS})
+                for row in rows)
+            profiles = Profile.objects.bulk_create(
+                Profile(user=user, invite=invite, invited=row.get('invited') or None)
+                for user, row, invite in zip(users, rows, invites))
+            # bulk_create не шлёт post_save: события ленты - тоже одним INSERT, в той же транзакции
+            append_many((ProfileEvent.PROFILE_CREATED, user.phone, {'invite': profile.invite, 'invited': profile.invited})
+                        for user, profile in zip(users, profiles))
+        return users, profiles
@@ -0,0 +1,71 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Нагрузочный прогон API по уже запущенному серверу: POST /api/v1/login/ и /api/v1/profile/. "
+            "Запустите его против WSGI (manage.py runserver / gunicorn config.wsgi) и ASGI "
+            "(uvicorn config.asgi:application, API_ASYNC = True) и сравните req/s и p99. "
+            "Лимиты RATELIMITS на время прогона нужно поднять.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--phone-base', type=int, default=9500000000)
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        total, concurrency = options['requests'], options['concurrency']
+        latencies, statuses = [], Counter()
+        lock = threading.Lock()
+        counter = iter(range(total))
+
+        def worker():
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            while True:
+                with lock:
+                    num = next(counter, None)
+                if num is None:
+                    break
+                # чётные - вход/регистрация, нечётные - чтение профиля того же номера
+                path = '/api/v1/login/' if num % 2 == 0 else '/api/v1/profile/'
+                body = json.dumps({'phone': str(options['phone_base'] + num // 2)})
+                start = time.perf_counter()
+                try:
+                    connection.request('POST', path, body, {'Content-Type': 'application/json'})
+                    response = connection.getresponse()
+                    response.read()
+                    code = response.status
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+                    code = 'error'
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[code] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(json.dumps({
+            'url': options['url'], 'requests': total, 'concurrency': concurrency,
+            'rps': round(total / elapsed, 1),
+            'p50_ms': round(quantiles[49] * 1000, 2), 'p99_ms': round(quantiles[98] * 1000, 2),
+            'statuses': {str(code): count for code, count in statuses.items()},
+        }, indent=2))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.referrals import rebuild_follower_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитать счётчики прямых и всех последователей (followers_direct, followers_total) с нуля"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            count = rebuild_follower_counters(options['batch_size'])
+        self.stdout.write(f"Исправлено профилей: {count} за {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,201 @@
+"""
+Метрики в памяти процесса: гистограммы времени ответа, числа и времени SQL по имени URL
+и времени отправки OTP. Отдаются в текстовом формате Prometheus (metrics_view).
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# имя: (описание, границы корзин)
+HISTOGRAMS = {
+    'http_request_duration_seconds': ("Время обработки запроса", LATENCY_BUCKETS),
+    'http_request_db_queries': ("Число SQL-запросов на запрос", QUERY_COUNT_BUCKETS),
+    'http_request_db_duration_seconds': ("Суммарное время SQL на запрос", LATENCY_BUCKETS),
+    'otp_send_duration_seconds': ("Время постановки OTP в очередь (queue) или отправки (inline)", LATENCY_BUCKETS),
+}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count', 'lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина - +Inf
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.total, self.count
+
+
+_series = {}
+_series_lock = threading.Lock()
+
+
+def observe(name, value, **labels) -> None:
+    key = (name, tuple(sorted(labels.items())))
+    if (histogram := _series.get(key)) is None:
+        with _series_lock:
+            histogram = _series.setdefault(key, Histogram(HISTOGRAMS[name][1]))
+    histogram.observe(value)
+
+
+def reset() -> None:
+    with _series_lock:
+        _series.clear()
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ''
+    escaped = (f'{name}="{str(value).translate(_ESCAPES)}"' for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+_ESCAPES = str.maketrans({'\\': r'\\', '"': r'\"', '\n': r'\n'})
+
+
+def _gauges() -> dict:
+    """Счётчики уже созданных компонентов: кэш ответов профиля, очередь отправки OTP, множество кодов."""
+    from accounts import delivery, invite_filter, profile_cache
+
+    gauges = {}
+    if profile_cache._profile_cache is not None:
+        gauges |= {f'profile_cache_{key}': value for key, value in profile_cache._profile_cache.stats().items()}
+    if delivery._delivery_queue is not None:
+        gauges |= {f'otp_delivery_{key}': value for key, value in delivery._delivery_queue.stats().items()}
+    if invite_filter._invite_filter is not None:
+        gauges |= {f'invite_filter_{key}': value for key, value in invite_filter._invite_filter.stats().items()}
+    return gauges
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    with _series_lock:
+        series = sorted(_series.items())
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for (series_name, labels), histogram in series:
+            if series_name != name:
+                continue
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, num in zip(buckets + ('+Inf',), counts):
+                cumulative += num
+                lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+    for name, value in _gauges().items():
+        lines += [f'# TYPE {name} gauge', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+class RequestQueries:
+    __slots__ = ('count', 'time', 'sql')
+
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.time = 0.0
+        self.sql = [] if keep_sql else None
+
+
+# SQL текущего запроса; contextvar доходит и до потоков sync_to_async в async-обработчиках
+_current = ContextVar('request_queries', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка connection.execute_wrapper: считает запросы и их время для текущего HTTP-запроса."""
+    if (queries := _current.get()) is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        queries.count += 1
+        queries.time += elapsed
+        if queries.sql is not None:
+            queries.sql.append((elapsed, sql))
+
+
+def instrument_connection(connection) -> None:
+    """
+    Подключить record_query к соединению насовсем (как connection.execute_wrapper(), но без выхода
+    из блока): так учитываются все алиасы баз и соединения потоков sync_to_async.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    """
+    Время ответа, число и время SQL по имени URL. При METRICS_SLOW_REQUEST_SECONDS
+    запросы медленнее порога пишутся в лог accounts.metrics вместе с их SQL.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow = settings.METRICS_SLOW_REQUEST_SECONDS
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = RequestQueries(self.slow is not None)
+        token = _current.set(queries)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = RequestQueries(self.slow is not None)
+        token = _current.set(queries)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, time.perf_counter() - start, queries)
+        return response
+
+    def record(self, request, elapsed, queries) -> None:
+        view = getattr(request.resolver_match, 'view_name', None) or 'unresolved'
+        observe('http_request_duration_seconds', elapsed, view=view, method=request.method)
+        observe('http_request_db_queries', queries.count, view=view)
+        observe('http_request_db_duration_seconds', queries.time, view=view)
+        if self.slow is not None and elapsed >= self.slow:
+            statements = '\n'.join(f'  {duration * 1000:.1f} ms  {sql}' for duration, sql in queries.sql)
+            logger.warning("Медленный запрос %s %s (%s): %.3f s, SQL: %d за %.3f s\n%s", request.method,
+                           request.path, view, elapsed, queries.count, queries.time, statements)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['invited', 'id'], name='IX_profile_invited'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_profile_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('profile_created', 'Профиль создан'), ('invited_set', 'Введён пригласительный код'), ('profile_changed', 'Изменены email или имя'), ('login', 'Вход по OTP')], max_length=20)),
+                ('phone', models.CharField(max_length=10)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created'], name='IX_event_created')],
+            },
+        ),
+    ]
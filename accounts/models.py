@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 from accounts.utils import generate_code, phone_regex
 
@@ -14,10 +16,27 @@ class PhoneUserManager(BaseUserManager):
         if not phone:
             raise ValueError('Введите номер телефона!')
         user = self.model(phone=phone, **extra_fields)
-        user.set_password(password)
+        if password is None:
+            user.password = UNUSABLE_PASSWORD_PREFIX  # вход только по OTP, хешировать нечего
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         return user
 
+    def create_phone_user(self, phone, invited=None, invite=None, **extra_fields):
+        """
+        Создать пользователя для входа по OTP вместе с профилем в одной транзакции.
+        Пароль не хешируется; пригласительный код выдаётся до транзакции (или передан готовым).
+        """
+        from accounts.referrals import attach_follower
+
+        invite = invite or generate_code()
+        with transaction.atomic(using=self._db):
+            user = self.create_user(phone, **extra_fields)
+            profile = Profile.objects.using(self._db).create(user=user, invite=invite, invited=invited)
+            attach_follower(profile)
+        return user
+
     def create_user(self, phone, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', False)
         extra_fields.setdefault('is_superuser', False)
@@ -59,6 +78,53 @@ class Profile(models.Model):
     otpattempts = models.IntegerField(null=True, blank=True)
     invite = models.CharField(max_length=6, unique=True, default=generate_code)
     invited = models.CharField(max_length=6, null=True, blank=True)
+    # счётчики последователей: прямых и по всему дереву приглашений (см. accounts.referrals)
+    followers_direct = models.IntegerField(default=0)
+    followers_total = models.IntegerField(default=0)
+    # миниатюры аватара: {'source': имя исходника, 'hash': ..., 'sizes': {размер: имя файла}} (см. accounts.avatars)
+    avatar_variants = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            # выборка последователей по коду с keyset-пагинацией по id
+            models.Index(fields=['invited', 'id'], name='IX_profile_invited'),
+            # фильтры админки: коды, ожидающие ввода, и пригласившие с наибольшим числом последователей
+            models.Index(fields=['otptime'], name='IX_profile_otptime', condition=models.Q(otptime__isnull=False)),
+            models.Index(fields=['-followers_direct'], name='IX_profile_followers'),
+        ]
 
     def __str__(self):
         return f"{self.user}"
+
+
+class InviteSequence(models.Model):
+    """Счётчик выданных номеров пригласительных кодов; воркеры резервируют из него блоки."""
+    next_value = models.BigIntegerField(default=0)
+
+
+class ProfileEvent(models.Model):
+    """
+    Событие профиля (transactional outbox): пишется в той же транзакции, что и изменение,
+    потребители читают ленту по возрастанию id (см. accounts.events).
+    """
+    PROFILE_CREATED = 'profile_created'
+    INVITED_SET = 'invited_set'
+    PROFILE_CHANGED = 'profile_changed'
+    LOGIN = 'login'
+    KINDS = [
+        (PROFILE_CREATED, 'Профиль создан'),
+        (INVITED_SET, 'Введён пригласительный код'),
+        (PROFILE_CHANGED, 'Изменены email или имя'),
+        (LOGIN, 'Вход по OTP'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    phone = models.CharField(max_length=10)
+    data = models.JSONField(default=dict, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # очистка старых событий (accounts.cleanup)
+            models.Index(fields=['created'], name='IX_event_created'),
+        ]
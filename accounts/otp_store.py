@@ -0,0 +1,273 @@
+import datetime
+import hashlib
+import hmac
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from accounts.models import Profile
+from config import settings
+
+# Результаты проверки одноразового пароля
+OTP_OK = 'ok'
+OTP_INVALID = 'invalid'
+OTP_EXHAUSTED = 'exhausted'
+OTP_EXPIRED = 'expired'
+
+
+# Списать попытку проверки, если код ещё жив и попытки остались (после списания их должно быть > 0,
+# как в CacheOtpStore); вернуть код для сравнения. Нет строки - попытка не засчитана.
+VERIFY_SQL = f"""
+UPDATE {Profile._meta.db_table} SET otpattempts = otpattempts - 1
+WHERE user_id = (SELECT id FROM {get_user_model()._meta.db_table} WHERE phone = %s)
+  AND otpattempts > 1 AND otptime > %s
+RETURNING otp
+"""
+
+
+def new_otp() -> int:
+    return random.randint(999, 9999)
+
+
+class BaseOtpStore:
+    """Хранилище одноразовых паролей: выдача и проверка кода по номеру телефона."""
+
+    def issue(self, phone, profile=None) -> int | None:
+        """
+        Выдать новый код. None - если не истёк OTP_RETRY_TIMEOUT с прошлой выдачи.
+        profile - уже прочитанный (и заблокированный) профиль, если он есть у вызывающего.
+        """
+        raise NotImplementedError
+
+    def verify(self, phone, otp) -> str:
+        """Списать попытку и проверить код. Возвращает один из OTP_* результатов."""
+        raise NotImplementedError
+
+    async def aissue(self, phone) -> int | None:
+        return await sync_to_async(self.issue)(phone)
+
+    async def averify(self, phone, otp) -> str:
+        return await sync_to_async(self.verify)(phone, otp)
+
+
+class DbOtpStore(BaseOtpStore):
+    """Хранит код в полях Profile.otp/otptime/otpattempts (поведение по умолчанию)."""
+
+    def issue(self, phone, profile=None) -> int | None:
+        profile = profile or Profile.objects.get(user__phone=phone)
+        if last_otp_time := profile.otptime:
+            timedelta = timezone.now() - last_otp_time
+            if timedelta.total_seconds() <= settings.OTP_RETRY_TIMEOUT:
+                return None
+        profile.otp = new_otp()
+        profile.otptime = timezone.now()
+        profile.otpattempts = settings.OTP_ATTEMPTS
+        profile.save(update_fields=['otp', 'otptime', 'otpattempts'])
+        return profile.otp
+
+    def verify(self, phone, otp) -> str:
+        """
+        Попытка списывается одним условным UPDATE ... RETURNING: параллельные проверки
+        не видят один и тот же счётчик, и больше OTP_ATTEMPTS попыток не получится.
+        Второй запрос - только если попытка не засчитана, чтобы назвать причину.
+        """
+        with connection.cursor() as cursor:
+            alive_since = timezone.now() - datetime.timedelta(seconds=settings.OTP_LIFETIME)
+            # номер из URL (<int:phone>) - число, а phone - varchar: PostgreSQL не сравнит их без приведения
+            cursor.execute(VERIFY_SQL, [str(phone), connection.ops.adapt_datetimefield_value(alive_since)])
+            row = cursor.fetchone()
+        if row:
+            return OTP_OK if otp == row[0] else OTP_INVALID
+        otptime, otpattempts = Profile.objects.values_list('otptime', 'otpattempts').get(user__phone=phone)
+        if otptime is None or otpattempts is None:
+            return OTP_EXPIRED
+        if (timezone.now() - otptime).total_seconds() >= settings.OTP_LIFETIME:
+            return OTP_EXPIRED
+        return OTP_EXHAUSTED
+
+    async def aissue(self, phone) -> int | None:
+        profile = await Profile.objects.aget(user__phone=phone)
+        if last_otp_time := profile.otptime:
+            timedelta = timezone.now() - last_otp_time
+            if timedelta.total_seconds() <= settings.OTP_RETRY_TIMEOUT:
+                return None
+        profile.otp = new_otp()
+        profile.otptime = timezone.now()
+        profile.otpattempts = settings.OTP_ATTEMPTS
+        await profile.asave(update_fields=['otp', 'otptime', 'otpattempts'])
+        return profile.otp
+
+
+class CacheOtpStore(BaseOtpStore):
+    """
+    Хранит код в кэше Django (OTP_CACHE) и не пишет в таблицу Profile.
+    Код и счётчик попыток истекают сами через OTP_LIFETIME и удаляются после
+    успешной проверки, отметка о выдаче - через OTP_RETRY_TIMEOUT.
+    """
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or settings.OTP_CACHE]
+
+    @staticmethod
+    def _keys(phone):
+        return f'otp:code:{phone}', f'otp:attempts:{phone}', f'otp:issued:{phone}'
+
+    def issue(self, phone, profile=None) -> int | None:
+        code_key, attempts_key, issued_key = self._keys(phone)
+        # add() атомарен: из параллельных запросов код получит только один
+        if not self.cache.add(issued_key, time.time(), timeout=settings.OTP_RETRY_TIMEOUT):
+            return None
+        otp = new_otp()
+        self.cache.set_many({code_key: (otp, time.time()), attempts_key: settings.OTP_ATTEMPTS},
+                            timeout=settings.OTP_LIFETIME)
+        return otp
+
+    def verify(self, phone, otp) -> str:
+        code_key, attempts_key, issued_key = self._keys(phone)
+        try:
+            attempts = self.cache.decr(attempts_key)
+        except ValueError:  # ключа нет - срок жизни пароля истёк
+            return OTP_EXPIRED
+        stored = self.cache.get(code_key)
+        if stored is None:
+            return OTP_EXPIRED
+        if attempts <= 0:
+            return OTP_EXHAUSTED
+        if otp != stored[0]:
+            return OTP_INVALID
+        # код одноразовый: из параллельных проверок его примет та, что первой удалила ключ
+        if not self.cache.delete(code_key):
+            return OTP_EXPIRED
+        self.cache.delete(attempts_key)
+        return OTP_OK
+
+    async def aissue(self, phone) -> int | None:
+        code_key, attempts_key, issued_key = self._keys(phone)
+        if not await self.cache.aadd(issued_key, time.time(), timeout=settings.OTP_RETRY_TIMEOUT):
+            return None
+        otp = new_otp()
+        await self.cache.aset_many({code_key: (otp, time.time()), attempts_key: settings.OTP_ATTEMPTS},
+                                   timeout=settings.OTP_LIFETIME)
+        return otp
+
+    async def averify(self, phone, otp) -> str:
+        code_key, attempts_key, issued_key = self._keys(phone)
+        try:
+            attempts = await self.cache.adecr(attempts_key)
+        except ValueError:
+            return OTP_EXPIRED
+        stored = await self.cache.aget(code_key)
+        if stored is None:
+            return OTP_EXPIRED
+        if attempts <= 0:
+            return OTP_EXHAUSTED
+        if otp != stored[0]:
+            return OTP_INVALID
+        if not await self.cache.adelete(code_key):
+            return OTP_EXPIRED
+        await self.cache.adelete(attempts_key)
+        return OTP_OK
+
+
+class TotpOtpStore(BaseOtpStore):
+    """
+    Код не хранится, а вычисляется: HMAC-SHA256 от OTP_SECRET по номеру и шагу времени
+    длиной OTP_LIFETIME (как TOTP из RFC 6238). Выдача ничего не пишет; при проверке
+    подходят коды текущего и предыдущего шага. В кэш OTP_CACHE пишутся только счётчик
+    попыток номера и номер шага последнего использованного кода (повторно его не принять).
+    Повторная выдача в том же шаге даёт тот же код, её частоту ограничивает RATELIMITS['otp_issue'].
+
+    Верный код у номера есть всегда, поэтому попытки считаются по номеру, а не по шагу:
+    счётчик живёт attempts_window() секунд от первой попытки и со сменой шага не обнуляется.
+    """
+
+    def __init__(self, alias=None, secret=None):
+        self.cache = caches[alias or settings.OTP_CACHE]
+        self.key = (secret or settings.OTP_SECRET).encode()
+
+    @staticmethod
+    def step(now=None) -> int:
+        return int((time.time() if now is None else now) // settings.OTP_LIFETIME)
+
+    @staticmethod
+    def attempts_window() -> int:
+        # не меньше, чем живёт код (два шага), и не меньше паузы между выдачами
+        return max(settings.OTP_LIFETIME * 2, settings.OTP_RETRY_TIMEOUT)
+
+    def code(self, phone, step) -> int:
+        digest = hmac.digest(self.key, f'{phone}:{step}'.encode(), hashlib.sha256)
+        offset = digest[-1] & 0x0f  # динамическое усечение, RFC 4226
+        value = int.from_bytes(digest[offset:offset + 4]) & 0x7fffffff
+        return 1000 + value % 9000
+
+    @staticmethod
+    def _keys(phone):
+        return f'otp:totp:attempts:{phone}', f'otp:totp:used:{phone}'
+
+    def issue(self, phone, profile=None) -> int | None:
+        return self.code(phone, self.step())
+
+    def _match(self, phone, otp, step, used) -> int | None:
+        """Шаг, чей код совпал с otp и ещё не использован; None - не совпал."""
+        for candidate in (step, step - 1):
+            if candidate > used and hmac.compare_digest(str(self.code(phone, candidate)), str(otp)):
+                return candidate
+        return None
+
+    def verify(self, phone, otp) -> str:
+        """
+        Попытка списывается до сравнения (add + incr атомарны): параллельные
+        запросы не получат больше OTP_ATTEMPTS - 1 попыток за attempts_window().
+        """
+        step = self.step()
+        attempts_key, used_key = self._keys(phone)
+        self.cache.add(attempts_key, 0, timeout=self.attempts_window())
+        try:
+            attempts = self.cache.incr(attempts_key)
+        except ValueError:  # ключ вытеснен между add и incr
+            self.cache.set(attempts_key, 1, timeout=self.attempts_window())
+            attempts = 1
+        if attempts >= settings.OTP_ATTEMPTS:
+            return OTP_EXHAUSTED
+        if (matched := self._match(phone, otp, step, self.cache.get(used_key, -1))) is None:
+            # истёкший код не отличить от неверного: его никто не хранил
+            return OTP_INVALID
+        self.cache.set(used_key, matched, timeout=settings.OTP_LIFETIME * 2)
+        self.cache.delete(attempts_key)
+        return OTP_OK
+
+    async def aissue(self, phone) -> int | None:
+        return self.issue(phone)
+
+    async def averify(self, phone, otp) -> str:
+        step = self.step()
+        attempts_key, used_key = self._keys(phone)
+        await self.cache.aadd(attempts_key, 0, timeout=self.attempts_window())
+        try:
+            attempts = await self.cache.aincr(attempts_key)
+        except ValueError:
+            await self.cache.aset(attempts_key, 1, timeout=self.attempts_window())
+            attempts = 1
+        if attempts >= settings.OTP_ATTEMPTS:
+            return OTP_EXHAUSTED
+        if (matched := self._match(phone, otp, step, await self.cache.aget(used_key, -1))) is None:
+            return OTP_INVALID
+        await self.cache.aset(used_key, matched, timeout=settings.OTP_LIFETIME * 2)
+        await self.cache.adelete(attempts_key)
+        return OTP_OK
+
+
+_store = None
+
+
+def get_otp_store() -> BaseOtpStore:
+    global _store
+    if _store is None:
+        _store = import_string(settings.OTP_STORE)()
+    return _store
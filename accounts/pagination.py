@@ -0,0 +1,8 @@
+from rest_framework.pagination import CursorPagination
+
+from config import settings
+
+
+class FollowersPagination(CursorPagination):
+    page_size = settings.FOLLOWERS_PAGE_SIZE
+    ordering = 'id'
@@ -0,0 +1,22 @@
+import hmac
+
+from rest_framework import permissions
+
+from config import settings
+
+
+def is_service_request(request) -> bool:
+    """Служебный клиент: заголовок Authorization: Bearer <один из SERVICE_TOKENS> или сотрудник (is_staff)."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        if any(hmac.compare_digest(token.encode(), known.encode()) for known in settings.SERVICE_TOKENS):
+            return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+class IsService(permissions.BasePermission):
+    """Только служебные клиенты (см. is_service_request): данные многих пользователей сразу."""
+
+    def has_permission(self, request, view):
+        return is_service_request(request)
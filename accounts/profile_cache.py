@@ -0,0 +1,159 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+
+from accounts.avatars import avatar_url
+from accounts.serializers import ProfileOut
+from config import settings
+
+# поля профиля, от которых зависит ответ API; сохранение остальных (OTP) кэш не сбрасывает
+PROFILE_RESPONSE_FIELDS = frozenset({'invite', 'invited', 'avatar', 'avatar_variants'})
+
+
+class ProfileResponseCache:
+    """
+    Read-through кэш ответов API профиля по номеру телефона.
+    У каждого номера есть версия в общем кэше; сброс - новая версия, старые ответы
+    просто перестают находиться. Перед общим кэшем - LRU в памяти процесса: при совпадении
+    версии готовый ответ берётся из него, и на запрос уходит одно обращение к кэшу.
+    """
+
+    def __init__(self, alias=None, timeout=None, local_size=None):
+        self.cache = caches[alias or settings.PROFILE_CACHE]
+        self.timeout = timeout or settings.PROFILE_CACHE_TIMEOUT
+        self.local_size = local_size if local_size is not None else settings.PROFILE_CACHE_LOCAL_SIZE
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @staticmethod
+    def _version_key(phone) -> str:
+        return f'profile:ver:{phone}'
+
+    @staticmethod
+    def _response_key(phone, variant, version) -> str:
+        return f'profile:resp:{phone}:{variant}:{version}'
+
+    def _count(self, name, num=1):
+        with self.lock:
+            self.counters[name] += num
+
+    def version(self, phone):
+        key = self._version_key(phone)
+        if (version := self.cache.get(key)) is None:
+            # новая версия - время в нс: после вытеснения ключа старая версия не вернётся
+            self.cache.add(key, time.time_ns(), timeout=None)
+            version = self.cache.get(key)
+        return version
+
+    def get(self, phone, variant, version):
+        """(данные, ETag) сохранённого ответа этой версии или None."""
+        with self.lock:
+            if (entry := self.local.get((phone, variant))) and entry[0] == version:
+                self.local.move_to_end((phone, variant))
+                self.counters['local_hits'] += 1
+                return entry[1], entry[2]
+        if found := self.cache.get(self._response_key(phone, variant, version)):
+            self._count('shared_hits')
+            self._remember(phone, variant, version, *found)
+            return found
+        self._count('misses')
+        return None
+
+    def set(self, phone, variant, version, data) -> str:
+        etag = '"%s"' % hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        self.cache.set(self._response_key(phone, variant, version), (data, etag), timeout=self.timeout)
+        self._remember(phone, variant, version, data, etag)
+        return etag
+
+    def _remember(self, phone, variant, version, data, etag):
+        if not self.local_size:
+            return
+        with self.lock:
+            self.local[(phone, variant)] = (version, data, etag)
+            self.local.move_to_end((phone, variant))
+            while len(self.local) > self.local_size:
+                self.local.popitem(last=False)
+
+    def fetch(self, phone, variant, build):
+        """
+        Ответ из кэша, иначе build() - собрать, сохранить и вернуть (данные, ETag).
+        build() возвращает None, если профиля нет; такой ответ не кэшируется.
+        Версия читается до обращения к базе: сброс во время сборки не даст сохранить устаревшее.
+        """
+        version = self.version(phone)
+        if found := self.get(phone, variant, version):
+            return found
+        if (data := build()) is None:
+            return None
+        return data, self.set(phone, variant, version, data)
+
+    async def afetch(self, phone, variant, abuild):
+        version = self.version(phone)
+        if found := self.get(phone, variant, version):
+            return found
+        if (data := await abuild()) is None:
+            return None
+        return data, self.set(phone, variant, version, data)
+
+    def invalidate(self, *phones) -> None:
+        for phone in phones:
+            try:
+                self.cache.incr(self._version_key(phone))
+            except ValueError:
+                self.cache.set(self._version_key(phone), time.time_ns(), timeout=None)
+        self._count('invalidations', len(phones))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counters, local_size=len(self.local))
+
+
+_profile_cache = None
+
+
+def get_profile_cache() -> ProfileResponseCache:
+    global _profile_cache
+    if _profile_cache is None:
+        _profile_cache = ProfileResponseCache()
+    return _profile_cache
+
+
+def invalidate_profiles(*phones) -> None:
+    """
+    Сбросить ответы по номерам сразу и ещё раз после фиксации транзакции:
+    чтение, успевшее между ними закэшировать незафиксированное прежнее состояние, тоже устареет.
+    """
+    phones = [phone for phone in phones if phone]
+    if not phones:
+        return
+    cache = get_profile_cache()
+    cache.invalidate(*phones)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.invalidate(*phones))
+
+
+def profile_data(loader, avatar_size=None) -> dict | None:
+    """Ответ API профиля из загрузчика; URL аватара относительный (см. absolute_profile_data)."""
+    if not loader.profile:
+        return None
+    url = avatar_url(loader.profile, avatar_size)
+    return ProfileOut.from_instances(loader.user, loader.profile, loader.follower_phones, loader.followers_count,
+                                     url if url != "None" else None).data
+
+
+def absolute_profile_data(request, data) -> dict:
+    if data.get('avatar_url'):
+        data = dict(data, avatar_url=request.build_absolute_uri(data['avatar_url']))
+    return data
+
+
+def not_modified(request, etag) -> bool:
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in etags or '*' in etags
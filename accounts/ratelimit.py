@@ -0,0 +1,136 @@
+import json
+import math
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils.module_loading import import_string
+
+from config import settings
+
+
+class CacheRateLimiter:
+    """
+    Скользящее окно поверх кэша Django: счётчики текущего и прошлого окна,
+    прошлое учитывается с весом оставшейся доли. Только add/incr/get - без блокировок,
+    атомарно для всех воркеров при общем кэше (Redis, Memcached).
+    """
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or settings.RATELIMIT_CACHE]
+
+    def hit(self, key, limit, period) -> float:
+        """Учесть запрос. 0 - разрешён, иначе через сколько секунд повторить."""
+        now = time.time()
+        window, elapsed = divmod(now, period)
+        current_key, previous_key = f'rl:{key}:{int(window)}', f'rl:{key}:{int(window) - 1}'
+        self.cache.add(current_key, 0, timeout=period * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:  # ключ успел истечь между add и incr
+            self.cache.set(current_key, 1, timeout=period * 2)
+            current = 1
+        previous = self.cache.get(previous_key, 0)
+        if previous * (1 - elapsed / period) + current <= limit:
+            return 0
+        if current > limit or not previous:
+            return period - elapsed
+        # когда вес прошлого окна упадёт настолько, что запрос уложится в лимит
+        return max(period * (1 - (limit - current) / previous) - elapsed, 0.001)
+
+
+class LocalRateLimiter:
+    """Token bucket в памяти процесса - для тестов и одиночного сервера разработки."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, period) -> float:
+        rate = limit / period
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(key, (limit, now))
+            tokens = min(limit, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return 0
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+
+_limiter = None
+
+
+def get_rate_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = import_string(settings.RATELIMIT_BACKEND)()
+    return _limiter
+
+
+def request_value(request, kwargs, name):
+    """Значение ключа лимита: ip, либо поле из URL, тела запроса (DRF или JSON) или формы."""
+    if name == 'ip':
+        return request.META.get('REMOTE_ADDR')
+    if name == 'invite':
+        name = 'invited'
+    if value := kwargs.get(name):
+        return value
+    data = getattr(request, 'data', None)
+    if data is None and request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = {}
+    data = data or request.POST
+    return data.get(name) if isinstance(data, dict) else None
+
+
+def check_limits(request, kwargs, scope, template=None):
+    """None - запрос укладывается в лимиты, иначе готовый ответ 429."""
+    if request.method != 'POST':
+        return None
+    retry_after = 0
+    for name, (limit, period) in settings.RATELIMITS[scope].items():
+        if value := request_value(request, kwargs, name):
+            retry_after = max(retry_after, get_rate_limiter().hit(f'{scope}:{name}:{value}', limit, period))
+    if not retry_after:
+        return None
+    seconds = math.ceil(retry_after)
+    message = f'Слишком много запросов. Повторите через {seconds} с.'
+    if template:
+        response = render(request, template, {'error': True, 'msg': message}, status=429)
+    else:
+        response = JsonResponse({'detail': message}, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def ratelimit(scope, template=None):
+    """
+    Ограничить POST по правилам settings.RATELIMITS[scope]: {ключ: (лимит, период в секундах)}.
+    Ключи - phone, ip, invite. Превышение - 429 с Retry-After, без обращения к базе.
+    С template отвечает этой страницей с сообщением об ошибке, иначе JSON.
+    Подходит и для обычных, и для async-обработчиков.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if response := await sync_to_async(check_limits)(request, kwargs, scope, template):
+                    return response
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if response := check_limits(request, kwargs, scope, template):
+                return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
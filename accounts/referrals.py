@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, router, transaction
+from django.db.models import F
+
+from accounts.models import Profile
+
+PROFILE_TABLE = Profile._meta.db_table
+USER_TABLE = get_user_model()._meta.db_table
+
+# Цепочка пригласивших вверх от кода; UNION (без ALL) останавливается на циклах.
+# Размер присоединяемого поддерева читается тем же запросом, а не передаётся из прочитанного
+# раньше профиля: за это время к поддереву могли присоединиться новые последователи
+ANCESTORS_UPDATE_SQL = f"""
+    WITH RECURSIVE chain(invite, invited) AS (
+        SELECT invite, invited FROM {PROFILE_TABLE} WHERE invite = %s
+        UNION
+        SELECT p.invite, p.invited FROM {PROFILE_TABLE} p JOIN chain c ON p.invite = c.invited
+    )
+    UPDATE {PROFILE_TABLE}
+    SET followers_total = followers_total + 1 + (SELECT followers_total FROM {PROFILE_TABLE} WHERE invite = %s)
+    WHERE invite IN (SELECT invite FROM chain)
+"""
+
+SUBTREE_SQL = f"""
+    WITH RECURSIVE tree(id, invite, depth) AS (
+        SELECT id, invite, 0 FROM {PROFILE_TABLE} WHERE invite = %s
+        UNION ALL
+        SELECT p.id, p.invite, t.depth + 1 FROM {PROFILE_TABLE} p JOIN tree t ON p.invited = t.invite
+        WHERE t.depth < %s
+    )
+    SELECT u.phone, p.invite, p.invited, t.depth
+    FROM tree t JOIN {PROFILE_TABLE} p ON p.id = t.id JOIN {USER_TABLE} u ON u.id = p.user_id
+    WHERE t.depth > 0
+    ORDER BY t.depth, t.id
+"""
+
+
+def attach_follower(profile) -> None:
+    """
+    Учесть, что profile только что получил пригласительный код invited:
+    +1 прямой последователь у пригласившего, +(1 + поддерево profile)
+    к общему счётчику у всей цепочки пригласивших.
+    """
+    if not profile.invited:
+        return
+    with transaction.atomic():
+        Profile.objects.filter(invite=profile.invited).update(followers_direct=F('followers_direct') + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(ANCESTORS_UPDATE_SQL, [profile.invited, profile.invite])
+
+
+def referral_subtree(invite_code, depth) -> list:
+    """Все приглашённые по коду на глубину до depth уровней - одним запросом."""
+    # чтение: на реплику, если вызвано внутри read_from_replica()
+    with connections[router.db_for_read(Profile)].cursor() as cursor:
+        cursor.execute(SUBTREE_SQL, [invite_code, depth])
+        return [{'phone': phone, 'invite': invite, 'invited': invited, 'depth': level}
+                for phone, invite, invited, level in cursor.fetchall()]
+
+
+def rebuild_follower_counters(batch_size=5000) -> int:
+    """
+    Пересчитать followers_direct/followers_total всех профилей с нуля.
+    Пишутся только изменившиеся строки; возвращает их количество.
+    """
+    children = defaultdict(list)
+    ids = {}
+    current = {}
+    rows = Profile.objects.values_list('id', 'invite', 'invited', 'followers_direct', 'followers_total')
+    for pk, invite, invited, followers_direct, followers_total in rows.iterator(chunk_size=batch_size):
+        ids[invite] = pk
+        current[invite] = (followers_direct, followers_total)
+        if invited:
+            children[invited].append(invite)
+
+    direct = {invite: len(children.get(invite, ())) for invite in ids}
+    total = {}
+    for root in ids:
+        if root in total:
+            continue
+        # обход в глубину без рекурсии: сначала дети, потом родитель
+        stack = [(root, False)]
+        on_path = set()
+        while stack:
+            invite, done = stack.pop()
+            if done:
+                on_path.discard(invite)
+                total[invite] = sum(1 + total.get(child, 0) for child in children.get(invite, ()))
+                continue
+            if invite in total or invite in on_path:
+                continue
+            on_path.add(invite)
+            stack.append((invite, True))
+            stack.extend((child, False) for child in children.get(invite, ()))
+
+    rows = [(direct[invite], total[invite], pk) for invite, pk in ids.items()
+            if (direct[invite], total[invite]) != current[invite]]
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(f"UPDATE {PROFILE_TABLE} SET followers_direct = %s, followers_total = %s WHERE id = %s",
+                               rows[offset:offset + batch_size])
+    return len(rows)
@@ -0,0 +1,62 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from config import settings
+
+# реплика, выбранная для текущего блока read_from_replica(); None - читаем с основной базы
+_replica = ContextVar('replica', default=None)
+
+
+def _pin_key(phone) -> str:
+    return f'db:pin:{phone}'
+
+
+def pin_to_primary(*phones) -> None:
+    """
+    После записи данные номера какое-то время читаются с основной базы:
+    реплика могла ещё не догнать её (read-your-writes). Срок - REPLICA_PIN_SECONDS.
+    """
+    if settings.DATABASE_REPLICAS and phones:
+        caches[settings.REPLICA_PIN_CACHE].set_many({_pin_key(phone): 1 for phone in phones if phone},
+                                                    timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(phone) -> bool:
+    return bool(caches[settings.REPLICA_PIN_CACHE].get(_pin_key(phone)))
+
+
+@contextmanager
+def read_from_replica(phone):
+    """
+    Чтения внутри блока идут на случайную реплику из DATABASE_REPLICAS,
+    если данные этого номера недавно не менялись. Запись всегда - на основную базу.
+    """
+    if not settings.DATABASE_REPLICAS or is_pinned(phone):
+        yield None
+        return
+    token = _replica.set(random.choice(settings.DATABASE_REPLICAS))
+    try:
+        yield _replica.get()
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    """Основная база - для записи и по умолчанию; реплики - только внутри read_from_replica()."""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики - копии основной базы, объекты из них можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -3,6 +3,7 @@ from rest_framework import serializers
 
 from accounts.models import Profile
 from accounts.utils import phone_regex
+from config import settings
 
 
 class UserPhoneSerializer(serializers.ModelSerializer):
@@ -32,6 +33,21 @@ class ProfileInUserSerializer(serializers.Serializer):
     first_name = serializers.CharField(allow_blank=True, allow_null=True, required=False)
     last_name = serializers.CharField(allow_blank=True, allow_null=True, required=False)
     invited = serializers.CharField(allow_null=True, allow_blank=True, required=False)
+    avatar_size = serializers.IntegerField(min_value=1, required=False)
+
+
+class ProfileBulkSerializer(serializers.Serializer):
+    phones = serializers.ListField(child=serializers.CharField(max_length=10, validators=[phone_regex]),
+                                   allow_empty=False, max_length=settings.PROFILE_BULK_MAX_PHONES)
+    followers = serializers.BooleanField(default=False)
+    avatar_size = serializers.IntegerField(min_value=1, required=False)
+
+
+class EventsQuerySerializer(serializers.Serializer):
+    after = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.EVENTS_MAX_PAGE_SIZE,
+                                     default=settings.EVENTS_PAGE_SIZE)
+    wait = serializers.FloatField(min_value=0, max_value=settings.EVENTS_MAX_WAIT, default=0)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -40,14 +56,40 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('phone', 'email', 'first_name', 'last_name')
 
 
-class ProfileOutUserSerializer(serializers.Serializer):
-    user = serializers.CharField(write_only=True)
-    phone = serializers.CharField(write_only=True)
-    email = serializers.EmailField(allow_blank=True, allow_null=True, required=False)
-    first_name = serializers.CharField(allow_blank=True, allow_null=True, required=False)
-    last_name = serializers.CharField(allow_blank=True, allow_null=True, required=False)
-    invite = serializers.CharField(write_only=True)
-    invited = serializers.CharField(allow_null=True, allow_blank=True)
-    followers = serializers.JSONField(write_only=True)
-
+class ProfileOut:
+    """
+    Ответ API профиля. Данные прочитаны из своей же базы, поэтому собираются напрямую
+    из объектов модели, без проверки полей сериализатором.
+    """
+    __slots__ = ('user', 'phone', 'email', 'first_name', 'last_name', 'invite', 'invited',
+                 'followers', 'followers_count', 'avatar_url')
+
+    def __init__(self, user, phone, email, first_name, last_name, invite, invited,
+                 followers=(), followers_count=0, avatar_url=None):
+        self.user = str(user)
+        self.phone = phone
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.invite = invite
+        self.invited = invited
+        self.followers = list(followers)
+        self.followers_count = followers_count
+        self.avatar_url = avatar_url
+
+    @classmethod
+    def from_instances(cls, user, profile, followers=(), followers_count=0, avatar_url=None):
+        return cls(user.pk, user.phone, user.email, user.first_name, user.last_name,
+                   profile.invite, profile.invited, followers, followers_count, avatar_url)
+
+    @property
+    def data(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FollowerSerializer(serializers.ModelSerializer):
+    phone = serializers.CharField(source='user.phone', read_only=True)
 
+    class Meta:
+        model = Profile
+        fields = ('phone',)
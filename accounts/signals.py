@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.avatars import schedule_avatar
+from accounts import events
+from accounts.backends import forget_user
+from accounts.invite_filter import invites_created, invite_deleted
+from accounts.metrics import instrument_connection
+from accounts.models import Profile, ProfileEvent
+from accounts.profile_cache import PROFILE_RESPONSE_FIELDS, invalidate_profiles
+from accounts.routers import pin_to_primary
+from config import settings
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    pin_to_primary(instance.phone)
+    invalidate_profiles(instance.phone)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def forget_cached_profile_user(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+
+@receiver(post_init, sender=Profile)
+def remember_invited(sender, instance, **kwargs):
+    # через __dict__: у отложенного (defer/only) поля чтение ушло бы в базу
+    instance._loaded_invited = instance.__dict__.get('invited')
+    instance._loaded_invite = instance.__dict__.get('invite')
+
+
+def _phone(profile):
+    if Profile.user.is_cached(profile):
+        return profile.user.phone
+    return get_user_model().objects.filter(pk=profile.user_id).values_list('phone', flat=True).first()
+
+
+@receiver(post_init, sender=get_user_model())
+def remember_contacts(sender, instance, **kwargs):
+    # только загруженные поля: отложенные не сравниваем
+    instance._loaded_contacts = {field: instance.__dict__[field]
+                                 for field in events.CONTACT_FIELDS if field in instance.__dict__}
+
+
+@receiver(post_save, sender=get_user_model())
+def record_contacts_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & set(events.CONTACT_FIELDS):
+        return  # например, last_login при входе
+    changed = {field: getattr(instance, field) for field, value in instance._loaded_contacts.items()
+               if getattr(instance, field) != value}
+    if changed and not created:
+        events.append(ProfileEvent.PROFILE_CHANGED, instance.phone, **changed)
+    instance._loaded_contacts |= changed
+
+
+@receiver(user_logged_in)
+def record_login(sender, user, **kwargs):
+    events.append(ProfileEvent.LOGIN, user.phone)
+
+
+# до profile_changed: тот запоминает новое значение invited
+@receiver(post_save, sender=Profile)
+def record_profile_events(sender, instance, created, **kwargs):
+    if created:
+        events.append(ProfileEvent.PROFILE_CREATED, _phone(instance), invite=instance.invite, invited=instance.invited)
+    elif instance.invited and instance.invited != instance._loaded_invited:
+        events.append(ProfileEvent.INVITED_SET, _phone(instance), invited=instance.invited)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def profile_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    phones = [phone] if (phone := _phone(instance)) else []
+    # у пригласившего меняется список последователей
+    if instance.invited and (created or kwargs['signal'] is post_delete or instance.invited != instance._loaded_invited):
+        phones += get_user_model().objects.filter(Profile__invite=instance.invited).values_list('phone', flat=True)
+    instance._loaded_invited = instance.invited
+    pin_to_primary(*phones)
+    if not update_fields or PROFILE_RESPONSE_FIELDS & set(update_fields):
+        invalidate_profiles(*phones)
+
+
+@receiver(post_save, sender=Profile)
+def remember_invite(sender, instance, created, **kwargs):
+    if created or instance.invite != instance._loaded_invite:
+        invites_created(instance.invite)
+    instance._loaded_invite = instance.invite
+
+
+@receiver(post_delete, sender=Profile)
+def forget_invite(sender, instance, **kwargs):
+    invite_deleted(instance.invite)
+
+
+@receiver(post_save, sender=Profile)
+def process_new_avatar(sender, instance, **kwargs):
+    if instance.avatar and instance.avatar_variants.get('source') != instance.avatar.name:
+        transaction.on_commit(lambda: schedule_avatar(instance))
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    if settings.METRICS_ENABLED:
+        instrument_connection(connection)
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+
+from accounts.invite_filter import invite_exists
+from accounts.invites import get_invite_allocator
+from accounts.models import Profile
+from accounts.otp_store import get_otp_store
+from accounts.referrals import attach_follower
+
+
+class InviteNotFound(Exception):
+    """Новый пользователь пришёл с несуществующим пригласительным кодом."""
+
+
+class _InviteRequired(Exception):
+    pass
+
+
+def _locked_user(phone):
+    # блокируется только строка пользователя: профиль в LEFT JOIN, FOR UPDATE на нём PostgreSQL не допускает
+    return (get_user_model().objects.select_for_update(of=('self',)).select_related('Profile')
+            .filter(phone=phone).first())
+
+
+def _profile(user) -> Profile | None:
+    try:
+        return user.Profile if user else None
+    except Profile.DoesNotExist:
+        return None
+
+
+def login_or_create(phone, invited=None):
+    """
+    Вход по номеру: найти или создать пользователя с профилем и выдать код - одной транзакцией
+    под блокировкой строки пользователя. Возвращает (пользователь, код); код None -
+    не истёк OTP_RETRY_TIMEOUT. Параллельные первые входы с одним номером получают
+    одного и того же пользователя, а не ошибку уникальности.
+    """
+    invite = None
+    while True:
+        try:
+            with transaction.atomic():
+                return _login_or_create(phone, invited, invite)
+        except _InviteRequired:
+            # пригласительный код новому профилю - вне транзакции, см. InviteCodeAllocator
+            invite = get_invite_allocator().allocate()
+
+
+def _login_or_create(phone, invited, invite):
+    user = _locked_user(phone)
+    profile = _profile(user)
+    attach = False
+    if profile is None:
+        if invited and not invite_exists(invited):
+            raise InviteNotFound(invited)
+        if invite is None:
+            raise _InviteRequired
+        try:
+            with transaction.atomic():
+                if user is None:
+                    user = get_user_model().objects.create_phone_user(phone, invited=invited, invite=invite)
+                else:
+                    user.Profile = Profile.objects.create(user=user, invite=invite, invited=invited)
+                    attach_follower(user.Profile)
+        except IntegrityError:
+            # номер только что зарегистрирован параллельным входом - он уже зафиксирован
+            if (user := _locked_user(phone)) is None or _profile(user) is None:
+                raise
+        profile = user.Profile
+    elif invited and not profile.invited and invited != profile.invite:
+        attach = invite_exists(invited)
+
+    otp = get_otp_store().issue(phone, profile=profile)
+    if otp and attach:
+        profile.invited = invited
+        profile.save(update_fields=['invited'])
+        attach_follower(profile)
+    return user, otp
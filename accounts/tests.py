@@ -1,3 +1,998 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from accounts import metrics
+from accounts.avatars import avatar_url
+from accounts.async_views import AsyncLoginOrCreateAPIView, AsyncLoginOTPAPIView, AsyncProfileAPIUpdate
+from accounts.backends import user_cache_key
+from accounts.cleanup import SWEEPS
+from accounts.delivery import DeliveryQueue, FakeTransport
+from accounts.events import VERSION_KEY as EVENTS_VERSION_KEY, wait_for_events
+from accounts.invite_filter import InviteFilter, invite_exists, VERSION_KEY
+from accounts.invites import InviteCodeAllocator, ALPHABET, get_invite_allocator
+from accounts.models import Profile, InviteSequence, ProfileEvent
+from accounts.otp_store import get_otp_store, CacheOtpStore, DbOtpStore, TotpOtpStore, OTP_OK, OTP_INVALID, OTP_EXHAUSTED, OTP_EXPIRED
+from accounts.pagination import FollowersPagination
+from accounts.ratelimit import CacheRateLimiter, LocalRateLimiter
+from accounts.referrals import attach_follower, rebuild_follower_counters
+from accounts.serializers import ProfileOut
+from accounts.signup import login_or_create, InviteNotFound
+from config import settings
+
+
+class DeliveryQueueTest(SimpleTestCase):
+
+    def test_messages_are_sent_in_batches(self):
+        transport = FakeTransport(delay=0.05)
+        delivery = DeliveryQueue(transport, workers=1, batch_size=50)
+        for num in range(120):
+            self.assertTrue(delivery.enqueue(f'900000{num:04}', 1234))
+        delivery.join()
+        self.assertEqual(len(transport.sent), 120)
+        self.assertLess(len(transport.batches), 120)
+        self.assertTrue(all(len(batch) <= 50 for batch in transport.batches))
+        self.assertEqual(delivery.stats()['sent'], 120)
+
+    def test_failed_batch_is_retried(self):
+        transport = FakeTransport(fail_times=2)
+        delivery = DeliveryQueue(transport, workers=1, retries=3, backoff=0.001)
+        delivery.enqueue('9001112233', 1234)
+        delivery.join()
+        self.assertEqual(transport.sent, [('9001112233', 1234)])
+        self.assertEqual(delivery.stats()['retries'], 2)
+
+    def test_batch_is_failed_after_retries(self):
+        transport = FakeTransport(fail_times=10)
+        delivery = DeliveryQueue(transport, workers=1, retries=1, backoff=0.001)
+        delivery.enqueue('9001112233', 1234)
+        delivery.join()
+        self.assertEqual(delivery.stats()['failed'], 1)
+        self.assertEqual(transport.sent, [])
+
+    def test_full_queue_drops_message(self):
+        transport = FakeTransport(delay=0.2)
+        delivery = DeliveryQueue(transport, maxsize=1, workers=1, put_timeout=0.01)
+        results = [delivery.enqueue('9001112233', num) for num in range(5)]
+        self.assertIn(False, results)
+        self.assertEqual(delivery.stats()['dropped'], results.count(False))
+        delivery.join()
+
+
+class ProfilePageQueriesTest(TestCase):
+    # сессия и пользователь с профилем - из кэша (на холодную - один запрос), последователи
+    QUERY_BUDGET = 2
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(phone='9001112233')
+        self.profile = Profile.objects.create(user=self.user, invite='abc123')
+        for num in range(5):
+            follower = get_user_model().objects.create(phone=f'900000000{num}')
+            Profile.objects.create(user=follower, invite=f'flw00{num}', invited='abc123')
+        self.client.force_login(self.user)
+
+    def test_profile_page_query_budget(self):
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get('/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['followers']), 5)
+        self.assertEqual(response.context['invite'], 'abc123')
+
+    def test_cached_user_is_reused_and_invalidated(self):
+        self.client.get('/profile/')
+        with self.assertNumQueries(1):
+            self.client.get('/profile/')
+        self.profile.invited = 'flw000'
+        self.profile.save()
+        response = self.client.get('/profile/')
+        self.assertEqual(response.context['form'].initial['invited'], 'flw000')
+
+    def test_logout_forgets_cached_user(self):
+        self.client.get('/profile/')
+        self.client.get('/logout/')
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get('/profile/').status_code, 302)
+
+    def test_invalid_invite_is_rejected(self):
+        response = self.client.post('/profile/', {'invited': 'nocode'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Такого пригласительного не существует!', response.context['form'].non_field_errors())
+
+
+class FollowersAPITest(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create(phone='9001112233')
+        Profile.objects.create(user=user, invite='abc123')
+        for num in range(5):
+            follower = get_user_model().objects.create(phone=f'900000000{num}')
+            Profile.objects.create(user=follower, invite=f'flw00{num}', invited='abc123')
+
+    @mock.patch.object(FollowersPagination, 'page_size', 2)
+    def test_followers_are_cursor_paginated(self):
+        phones = []
+        url = '/api/v1/followers/9001112233/'
+        while url:
+            response = self.client.get(url).json()
+            self.assertLessEqual(len(response['results']), 2)
+            phones += [flw['phone'] for flw in response['results']]
+            url = response['next']
+        self.assertEqual(phones, [f'900000000{num}' for num in range(5)])
+
+    def test_unknown_phone_is_not_found(self):
+        self.assertEqual(self.client.get('/api/v1/followers/9009999999/').status_code, 404)
+        response = self.client.get('/api/v1/followers/9000000000/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    @mock.patch.object(settings, 'FOLLOWERS_PAGE_SIZE', 2)
+    def test_profile_returns_count_and_first_page(self):
+        response = self.client.post('/api/v1/profile/', {'phone': '9001112233'}, content_type='application/json')
+        self.assertEqual(response.json()['followers_count'], 5)
+        self.assertEqual(response.json()['followers'], ['9000000000', '9000000001'])
+
+
+@mock.patch.object(settings, 'SERVICE_TOKENS', ['service-token'])
+class ProfileBulkAPITest(TestCase):
+
+    def setUp(self):
+        inviter = get_user_model().objects.create_phone_user('9001112233')
+        for num in range(3):
+            get_user_model().objects.create_phone_user(f'900000000{num}', invited=inviter.Profile.invite)
+
+    def post(self, data, **headers):
+        return self.client.post('/api/v1/profiles/bulk/', data, content_type='application/json', headers=headers)
+
+    def bulk(self, **data):
+        response = self.post(data, Authorization='Bearer service-token')
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    @mock.patch.object(settings, 'FOLLOWERS_PAGE_SIZE', 2)
+    @mock.patch.object(settings, 'PROFILE_BULK_CHUNK', 3)
+    def test_profiles_are_streamed_in_request_order(self):
+        phones = ['9001112233', '9009999999', '9000000000', '9000000001', '9000000002']
+        with self.assertNumQueries(5):  # вторая пачка - без последователей, и их списка не запрашивает
+            lines = self.bulk(phones=phones, followers=True)
+        self.assertEqual([line['phone'] for line in lines], phones)
+        self.assertEqual((lines[0]['followers'], lines[0]['followers_count']), (['9000000000', '9000000001'], 3))
+        self.assertEqual(lines[1], {'phone': '9009999999', 'detail': 'Пользователь не найден!'})
+        self.assertEqual(lines[2]['followers_count'], 0)
+
+    def test_followers_list_is_optional_and_size_is_limited(self):
+        self.assertEqual(self.bulk(phones=['9001112233'])[0]['followers'], [])
+        response = self.post({'phones': ['9001112233'] * (settings.PROFILE_BULK_MAX_PHONES + 1)},
+                             Authorization='Bearer service-token')
+        self.assertEqual(response.status_code, 400)
+
+    def test_anonymous_callers_are_rejected(self):
+        self.assertEqual(self.post({'phones': ['9001112233']}).status_code, 403)
+        self.assertEqual(self.post({'phones': ['9001112233']}, Authorization='Bearer wrong').status_code, 403)
+
+
+class ProfileResponseCacheTest(TestCase):
+    url = '/api/v1/profile/'
+
+    def setUp(self):
+        cache.clear()
+        self.inviter = get_user_model().objects.create_phone_user('9001112233')
+
+    def post(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.post(self.url, {'phone': '9001112233'}, content_type='application/json', headers=headers)
+
+    def test_repeated_read_is_served_from_cache_with_etag(self):
+        etag = self.post()['ETag']
+        get_otp_store().issue('9001112233')  # сохранение OTP-полей ответ не меняет
+        with self.assertNumQueries(0):
+            response = self.post()
+        self.assertEqual((response.status_code, response['ETag']), (200, etag))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.post(etag).status_code, 304)
+
+    def test_new_follower_invalidates_inviter(self):
+        etag = self.post()['ETag']
+        get_user_model().objects.create_phone_user('9001112234', invited=self.inviter.Profile.invite)
+        response = self.post(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['followers'], response.json()['followers_count']), (['9001112234'], 1))
+
+    def test_user_change_invalidates_own_entry(self):
+        self.post()
+        self.inviter.first_name = 'Иван'
+        self.inviter.save()
+        self.assertEqual(self.post().json()['first_name'], 'Иван')
+
+
+@mock.patch.object(settings, 'DATABASE_REPLICAS', ['replica'])
+class ReplicaRouterTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.inviter = get_user_model().objects.create_phone_user('9001112233')
+        get_user_model().objects.create_phone_user('9001112234', invited=self.inviter.Profile.invite)
+        cache.clear()  # данные "давно" записаны: номера не закреплены за основной базой
+
+    def get_followers(self):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            phones = [flw['phone'] for flw in self.client.get('/api/v1/followers/9001112233/').json()['results']]
+        return phones, len(replica)
+
+    def test_reads_go_to_replica(self):
+        phones, replica_queries = self.get_followers()
+        self.assertEqual(phones, ['9001112234'])
+        self.assertGreater(replica_queries, 0)
+
+    def test_reads_stick_to_primary_after_write(self):
+        get_user_model().objects.create_phone_user('9001112235', invited=self.inviter.Profile.invite)
+        phones, replica_queries = self.get_followers()
+        self.assertEqual(phones, ['9001112234', '9001112235'])
+        self.assertEqual(replica_queries, 0)
+        self.assertEqual(self.client.get('/api/v1/followers/9001112234/').status_code, 200)
+
+
+@mock.patch.object(settings, 'SERVICE_TOKENS', ['service-token'])
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        get_user_model().objects.create_phone_user('9001112233')
+
+    def test_requests_are_exported_per_url_name(self):
+        self.client.get('/api/v1/followers/9001112233/')
+        self.client.post('/api/v1/login/', {'phone': '9001112234'}, content_type='application/json')
+        text = self.client.get('/metrics', headers={'Authorization': 'Bearer service-token'}).content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",view="followers"} 1', text)
+        self.assertIn('http_request_db_queries_bucket{view="followers",le="+Inf"} 1', text)
+        self.assertIn('otp_send_duration_seconds_count{mode="queue"} 1', text)
+
+    def test_metrics_are_not_public(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+
+    @mock.patch.object(settings, 'METRICS_SLOW_REQUEST_SECONDS', 0)
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.assertLogs('accounts.metrics', 'WARNING') as logs:
+            self.client.get('/api/v1/followers/9001112233/')
+        self.assertIn('SELECT', logs.output[0])
+
+
+class ReferralCountersTest(TestCase):
+
+    def make_profile(self, phone, invite, invited=None):
+        profile = Profile.objects.create(user=get_user_model().objects.create(phone=phone),
+                                         invite=invite, invited=invited)
+        attach_follower(profile)
+        return profile
+
+    def setUp(self):
+        # root <- a <- b <- c, root <- d
+        self.make_profile('9000000000', 'root00')
+        self.make_profile('9000000001', 'aaaaaa', 'root00')
+        self.make_profile('9000000002', 'bbbbbb', 'aaaaaa')
+        self.make_profile('9000000003', 'cccccc', 'bbbbbb')
+        self.make_profile('9000000004', 'dddddd', 'root00')
+
+    def counters(self):
+        return dict((invite, (direct, total)) for invite, direct, total in
+                    Profile.objects.values_list('invite', 'followers_direct', 'followers_total'))
+
+    def test_incremental_counters(self):
+        self.assertEqual(self.counters(), {'root00': (2, 4), 'aaaaaa': (1, 2), 'bbbbbb': (1, 1),
+                                           'cccccc': (0, 0), 'dddddd': (0, 0)})
+
+    def test_rebuild_matches_incremental(self):
+        expected = self.counters()
+        Profile.objects.update(followers_direct=0, followers_total=0)
+        self.assertEqual(rebuild_follower_counters(), 3)
+        self.assertEqual(self.counters(), expected)
+
+    def test_attaching_subtree_adds_its_size(self):
+        self.make_profile('9000000005', 'eeeeee')
+        Profile.objects.filter(invite='aaaaaa').update(invited=None)
+        rebuild_follower_counters()
+        subtree = Profile.objects.get(invite='aaaaaa')
+        subtree.invited = 'eeeeee'
+        subtree.save()
+        attach_follower(subtree)
+        self.assertEqual(self.counters()['eeeeee'], (1, 3))
+
+    def test_subtree_size_is_read_at_attach_time(self):
+        self.make_profile('9000000005', 'eeeeee')
+        stale = Profile.objects.get(invite='eeeeee')
+        self.make_profile('9000000006', 'ffffff', 'eeeeee')  # после чтения stale
+        stale.invited = 'dddddd'
+        stale.save(update_fields=['invited'])
+        attach_follower(stale)
+        self.assertEqual(self.counters()['dddddd'], (1, 2))
+        self.assertEqual(self.counters()['root00'], (2, 6))
+
+    def test_profile_form_does_not_write_back_cached_counters(self):
+        cache.clear()
+        profile = self.make_profile('9000000005', 'eeeeee')
+        self.client.force_login(profile.user)
+        self.client.get('/profile/')  # пользователь с профилем - в кэше
+        self.make_profile('9000000006', 'ffffff', 'eeeeee')  # счётчики - update() без сигналов
+        response = self.client.post('/profile/', {'invited': 'dddddd'})
+        self.assertEqual(response.status_code, 302)
+        counters = self.counters()
+        self.assertEqual(counters['eeeeee'], (1, 1))
+        self.assertEqual(counters['dddddd'], (1, 2))
+        self.assertEqual(counters['root00'], (2, 6))
+
+    def test_referral_tree_api_is_depth_limited(self):
+        response = self.client.get('/api/v1/referrals/9000000000/?depth=2').json()
+        self.assertEqual(response['followers_total'], 4)
+        self.assertEqual([(node['invite'], node['depth']) for node in response['tree']],
+                         [('aaaaaa', 1), ('dddddd', 1), ('bbbbbb', 2)])
+
+
+class InviteCodeAllocatorTest(TestCase):
+
+    def test_codes_are_unique_and_valid(self):
+        allocator = InviteCodeAllocator('test-key', block_size=100)
+        codes = [allocator.allocate() for _ in range(1000)]
+        self.assertEqual(len(set(codes)), 1000)
+        self.assertTrue(all(len(code) == 6 and set(code) <= set(ALPHABET) for code in codes))
+
+    def test_taken_codes_are_skipped(self):
+        allocator = InviteCodeAllocator('test-key', block_size=10)
+        taken = allocator.encode(allocator.permute(InviteSequence.objects.get_or_create(pk=1)[0].next_value))
+        Profile.objects.create(user=get_user_model().objects.create(phone='9001112233'), invite=taken)
+        self.assertNotIn(taken, allocator.allocate_many(10))
+
+    def test_profile_gets_allocated_invite(self):
+        users = [get_user_model().objects.create(phone=f'900111223{num}') for num in range(3)]
+        profiles = [Profile.objects.create(user=user) for user in users]
+        self.assertEqual(len({profile.invite for profile in profiles}), 3)
+
+    def test_rolled_back_reservation_leaves_no_block(self):
+        # SQLite: резерв - в самой транзакции и без блока, откат возвращает и счётчик, и код
+        allocator = InviteCodeAllocator('test-key', block_size=100)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            code = allocator.allocate()
+            raise RuntimeError
+        self.assertEqual(allocator.codes, [])
+        self.assertEqual(allocator.allocate(), code)
+
+
+class InviteSequenceReserveTest(TransactionTestCase):
+
+    def test_separate_reservation_creates_and_advances_the_counter(self):
+        self.assertEqual(InviteCodeAllocator.reserve_separately(10), 10)
+        self.assertEqual(InviteCodeAllocator.reserve_separately(5), 15)
+        self.assertEqual(InviteSequence.objects.get(pk=1).next_value, 15)
+
+
+class CreatePhoneUserTest(TestCase):
+
+    def test_user_and_profile_are_created_without_password(self):
+        inviter = get_user_model().objects.create_phone_user('9001112233')
+        user = get_user_model().objects.create_phone_user('9001112234', invited=inviter.Profile.invite)
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(Profile.objects.get(user=user).invited, inviter.Profile.invite)
+        self.assertEqual(Profile.objects.get(user=inviter).followers_direct, 1)
+
+    def test_failed_signup_leaves_no_user(self):
+        with mock.patch('accounts.referrals.attach_follower', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            get_user_model().objects.create_phone_user('9001112233', invited='abc123')
+        self.assertFalse(get_user_model().objects.filter(phone='9001112233').exists())
+
+
+class ImportExportProfilesTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.inviter = get_user_model().objects.create_phone_user('9001112233').Profile.invite
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'profiles.csv')
+        with open(self.path, 'w', encoding='utf-8') as stream:
+            stream.write('phone,email,first_name,last_name,invited\n'
+                         f'9001112234,a@b.ru,Иван,,{self.inviter}\n'
+                         '12345,,,,\n'  # некорректный номер
+                         '9001112234,,,,\n'  # повтор в файле
+                         '9001112233,,,,\n'  # уже зарегистрирован
+                         '9001112235,,,,nocode\n')
+
+    def test_import_skips_bad_rows_and_writes_counters_and_events(self):
+        out = io.StringIO()
+        call_command('import_profiles', self.path, stdout=out)
+        self.assertIn("{'created': 2, 'bad_phone': 1, 'duplicate': 2, 'bad_invite': 1}", out.getvalue())
+        profiles = dict(Profile.objects.values_list('user__phone', 'invited'))
+        self.assertEqual(profiles, {'9001112233': None, '9001112234': self.inviter, '9001112235': None})
+        self.assertEqual(get_user_model().objects.get(phone='9001112234').first_name, 'Иван')
+        self.assertEqual(Profile.objects.values_list('followers_direct', 'followers_total').get(invite=self.inviter),
+                         (1, 1))
+        self.assertEqual(set(ProfileEvent.objects.filter(kind=ProfileEvent.PROFILE_CREATED)
+                             .values_list('phone', flat=True)), {'9001112233', '9001112234', '9001112235'})
+
+    def test_phone_registered_during_import_is_skipped(self):
+        allocator = get_invite_allocator()
+
+        def allocate_many(count):
+            # регистрация через сайт между проверкой номеров и вставкой пачки
+            get_user_model().objects.create_phone_user('9001112235')
+            return allocator.allocate_many(count)
+
+        out = io.StringIO()
+        with mock.patch('accounts.management.commands.import_profiles.get_invite_allocator',
+                        return_value=mock.Mock(allocate_many=allocate_many)):
+            call_command('import_profiles', self.path, stdout=out)
+        self.assertIn("'created': 1,", out.getvalue())
+        self.assertEqual(get_user_model().objects.filter(phone__in=['9001112234', '9001112235']).count(), 2)
+
+    def test_export_round_trip(self):
+        call_command('import_profiles', self.path, stdout=io.StringIO())
+        path = self.path.replace('.csv', '.jsonl')
+        call_command('export_profiles', path)
+        with open(path, encoding='utf-8') as stream:
+            rows = [json.loads(line) for line in stream]
+        self.assertEqual([row['phone'] for row in rows], ['9001112233', '9001112234', '9001112235'])
+        self.assertEqual((rows[0]['followers_direct'], rows[1]['invited'], rows[1]['email']),
+                         (1, self.inviter, 'a@b.ru'))
+
+
+class ProfileOutTest(TestCase):
+
+    def test_response_from_instances(self):
+        inviter = get_user_model().objects.create_phone_user('9001112233')
+        user = get_user_model().objects.create_phone_user('9001112234', invited=inviter.Profile.invite,
+                                                          email='a@b.ru', first_name='Иван')
+        data = ProfileOut.from_instances(user, user.Profile, ['9001112235'], 1).data
+        self.assertEqual(data, {'user': str(user.pk), 'phone': '9001112234', 'email': 'a@b.ru', 'first_name': 'Иван',
+                                'last_name': '', 'invite': user.Profile.invite, 'invited': inviter.Profile.invite,
+                                'followers': ['9001112235'], 'followers_count': 1, 'avatar_url': None})
+
+
+@mock.patch.object(settings, 'AVATAR_PROCESS_ASYNC', False)
+class AvatarVariantsTest(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    @staticmethod
+    def upload(phone):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, 'PNG')
+        user = get_user_model().objects.create_phone_user(phone)
+        user.Profile.avatar.save('face.png', ContentFile(buffer.getvalue()))
+        return Profile.objects.get(user=user)
+
+    def test_variants_are_built_once_per_content(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.upload('9001112233')
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.upload('9001112234')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.avatar_variants['sizes'], second.avatar_variants['sizes'])
+        for size, name in first.avatar_variants['sizes'].items():
+            with default_storage.open(name) as variant:
+                self.assertEqual(Image.open(variant).size, (int(size), int(size)))
+        self.assertTrue(avatar_url(first, 100).endswith('/256.webp'))
+        self.assertTrue(avatar_url(first, 1000).endswith('/512.webp'))
+
+    def test_concurrent_copy_of_same_variant_is_not_orphaned(self):
+        save = default_storage.save
+
+        def save_after_other_worker(name, content, **kwargs):
+            if name.endswith('.webp'):
+                save(name, ContentFile(b'other'))  # тот же файл только что сохранил другой поток
+            return save(name, content, **kwargs)
+
+        with mock.patch.object(default_storage, 'save', side_effect=save_after_other_worker), \
+                self.captureOnCommitCallbacks(execute=True):
+            profile = self.upload('9001112233')
+        profile.refresh_from_db()
+        directory = os.path.dirname(profile.avatar_variants['sizes']['64'])
+        self.assertEqual(sorted(default_storage.listdir(directory)[1]), ['256.webp', '512.webp', '64.webp'])
+
+    def test_processing_errors_are_logged(self):
+        with mock.patch('accounts.avatars.build_variants', side_effect=OSError('broken')), \
+                self.assertLogs('accounts.avatars', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            profile = self.upload('9001112233')
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_variants, {})
+
+    def test_processing_invalidates_cached_profile(self):
+        cache.clear()
+        executor = mock.Mock()
+        with mock.patch.object(settings, 'AVATAR_PROCESS_ASYNC', True), \
+                mock.patch('accounts.avatars.get_executor', return_value=executor), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.upload('9001112233')
+        read = lambda: self.client.post('/api/v1/profile/', {'phone': '9001112233'},
+                                        content_type='application/json').json()['avatar_url']
+        self.assertTrue(read().endswith('/face.png'))  # ещё не обработан - исходник, ответ в кэше
+        executor.submit.call_args.args[0](*executor.submit.call_args.args[1:])  # работа пула
+        self.assertTrue(read().endswith(f'/{settings.AVATAR_DEFAULT_SIZE}.webp'))
+
+
+class LoginOrCreateTest(TestCase):
+
+    def test_returning_user_login_is_one_locked_read_and_one_update(self):
+        get_user_model().objects.create_phone_user('9001112233')
+        with self.assertNumQueries(4):  # SAVEPOINT, SELECT пользователя с профилем, UPDATE кода, RELEASE
+            user, otp = login_or_create('9001112233')
+        self.assertEqual(Profile.objects.get(user=user).otp, otp)
+
+    def test_invite_is_validated_and_attached(self):
+        inviter = get_user_model().objects.create_phone_user('9001112233')
+        with self.assertRaises(InviteNotFound):
+            login_or_create('9001112234', invited='nocode')
+        self.assertFalse(get_user_model().objects.filter(phone='9001112234').exists())
+        user, otp = login_or_create('9001112234', invited=inviter.Profile.invite)
+        self.assertEqual(Profile.objects.get(user=user).invited, inviter.Profile.invite)
+        self.assertEqual(Profile.objects.get(user=inviter).followers_direct, 1)
+
+
+class LoginOrCreateConcurrencyTest(TransactionTestCase):
+
+    def test_parallel_first_logins_create_one_user(self):
+        def first_login(_):
+            try:
+                user, otp = login_or_create('9001112233')
+                return user.pk, otp
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(first_login, range(32)))
+        self.assertEqual(len({pk for pk, otp in results}), 1)
+        self.assertEqual(len([otp for pk, otp in results if otp]), 1)  # остальные упёрлись в OTP_RETRY_TIMEOUT
+        self.assertEqual(Profile.objects.filter(user__phone='9001112233').count(), 1)
+
+
+class DbOtpStoreTest(TestCase):
+
+    def setUp(self):
+        get_user_model().objects.create_phone_user('9001112233')
+        self.store = DbOtpStore()
+        self.otp = self.store.issue('9001112233')
+
+    def test_each_attempt_is_one_statement(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store.verify('9001112233', self.otp + 1), OTP_INVALID)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store.verify('9001112233', self.otp), OTP_OK)
+        self.assertEqual(self.store.verify('9001112233', self.otp), OTP_EXHAUSTED)
+
+    def test_expired_code(self):
+        Profile.objects.update(otptime=timezone.now() - datetime.timedelta(seconds=settings.OTP_LIFETIME))
+        self.assertEqual(self.store.verify('9001112233', self.otp), OTP_EXPIRED)
+
+    def test_phone_from_url_is_compared_as_text(self):
+        # <int:phone> даёт число; PostgreSQL не сравнит varchar с bigint
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.store.verify(9001112233, self.otp), OTP_OK)
+        self.assertIn("phone = '9001112233'", queries[0]['sql'])
+
+    def test_profile_patch_keeps_concurrent_attempts(self):
+        inviter = get_user_model().objects.create_phone_user('9001112234').Profile.invite
+
+        def verify_meanwhile(code):
+            # проверка кода списывает попытку, пока patch держит прочитанный раньше профиль
+            self.store.verify('9001112233', self.otp + 1)
+            return True
+
+        with mock.patch('accounts.views.invite_exists', side_effect=verify_meanwhile):
+            response = self.client.patch('/api/v1/profile/', {'phone': '9001112233', 'invited': inviter,
+                                                              'first_name': 'Иван'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        profile = Profile.objects.get(user__phone='9001112233')
+        self.assertEqual((profile.invited, profile.otpattempts), (inviter, settings.OTP_ATTEMPTS - 1))
+
+
+class CacheOtpStoreTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.store = CacheOtpStore()
+        self.otp = self.store.issue('9001112233')
+
+    def later(self, seconds):
+        # время кэша (LocMemCache) и хранилища - time.time()
+        return mock.patch('time.time', return_value=time.time() + seconds)
+
+    def test_reissue_waits_for_retry_timeout(self):
+        self.assertIsNone(self.store.issue('9001112233'))
+        self.assertIsNotNone(self.store.issue('9001112234'))
+        with self.later(settings.OTP_RETRY_TIMEOUT + 1):
+            self.assertIsNotNone(self.store.issue('9001112233'))
+
+    def test_attempts_run_out(self):
+        for _ in range(settings.OTP_ATTEMPTS - 1):
+            self.assertEqual(self.store.verify('9001112233', self.otp + 1), OTP_INVALID)
+        self.assertEqual(self.store.verify('9001112233', self.otp), OTP_EXHAUSTED)
+
+    def test_code_expires_by_itself(self):
+        self.assertEqual(self.store.verify('9001112234', self.otp), OTP_EXPIRED)  # не выдавался
+        with self.later(settings.OTP_LIFETIME + 1):
+            self.assertEqual(self.store.verify('9001112233', self.otp), OTP_EXPIRED)
+        cache.delete('otp:code:9001112233')  # счётчик пережил код
+        self.assertEqual(self.store.verify('9001112233', self.otp), OTP_EXPIRED)
+
+    async def test_async_issue_and_verify(self):
+        otp = await self.store.aissue('9001112234')
+        self.assertIsNone(await self.store.aissue('9001112234'))
+        self.assertEqual(await self.store.averify('9001112234', otp + 1), OTP_INVALID)
+        self.assertEqual(await self.store.averify('9001112234', otp), OTP_OK)
+        self.assertEqual(await self.store.averify('9001112234', otp), OTP_EXPIRED)
+
+    def test_code_is_not_accepted_twice(self):
+        self.assertEqual(self.store.verify('9001112233', self.otp), OTP_OK)
+        self.assertEqual(self.store.verify('9001112233', self.otp), OTP_EXPIRED)
+        self.assertIsNone(cache.get('otp:code:9001112233'))
+        self.assertIsNone(cache.get('otp:attempts:9001112233'))
+
+
+class TotpOtpStoreTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.store = TotpOtpStore(secret='test')
+
+    def test_issue_and_verify_touch_no_tables(self):
+        with self.assertNumQueries(0):
+            otp = self.store.issue('9001112233')
+            self.assertEqual(self.store.issue('9001112233'), otp)  # тот же шаг - тот же код
+            self.assertEqual(self.store.verify('9001112233', otp), OTP_OK)
+        self.assertTrue(999 < otp <= 9999)
+        self.assertNotEqual(TotpOtpStore(secret='other').issue('9001112233'), otp)
+
+    def test_code_is_accepted_once_and_attempts_are_limited(self):
+        otp = self.store.issue('9001112233')
+        self.assertEqual(self.store.verify('9001112233', otp + 1), OTP_INVALID)
+        self.assertEqual(self.store.verify('9001112233', otp), OTP_OK)
+        self.assertEqual(self.store.verify('9001112233', otp), OTP_INVALID)  # использован
+        self.assertEqual(self.store.verify('9001112234', self.store.issue('9001112233')), OTP_INVALID)
+
+    def test_failures_are_counted_across_steps(self):
+        for attempt in range(settings.OTP_ATTEMPTS - 1):
+            # каждая попытка - в новом шаге: верный код у номера есть всегда
+            with mock.patch('time.time', return_value=time.time() + settings.OTP_LIFETIME * attempt):
+                self.assertEqual(self.store.verify('9001112233', 0), OTP_INVALID)
+        later = time.time() + settings.OTP_LIFETIME * (settings.OTP_ATTEMPTS - 2) + 1  # окно ещё не кончилось
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(self.store.verify('9001112233', self.store.issue('9001112233')), OTP_EXHAUSTED)
+        with mock.patch('time.time', return_value=time.time() + self.store.attempts_window() + 1):
+            self.assertEqual(self.store.verify('9001112233', self.store.issue('9001112233')), OTP_OK)
+
+    def test_evicted_counter_is_not_an_error(self):
+        with mock.patch.object(self.store.cache, 'incr', side_effect=ValueError):
+            self.assertEqual(self.store.verify('9001112233', self.store.issue('9001112233')), OTP_OK)
+
+    def test_previous_step_is_accepted_then_expires(self):
+        otp = self.store.issue('9001112233')
+        with mock.patch('time.time', return_value=time.time() + settings.OTP_LIFETIME):
+            self.assertEqual(self.store.verify('9001112233', otp), OTP_OK)
+        otp = self.store.issue('9001112234')
+        with mock.patch('time.time', return_value=time.time() + settings.OTP_LIFETIME * 2):
+            self.assertEqual(self.store.verify('9001112234', otp), OTP_INVALID)
+
+    @mock.patch.object(settings, 'OTP_STORE', 'accounts.otp_store.TotpOtpStore')
+    def test_api_login(self):
+        with mock.patch('accounts.otp_store._store', None):
+            response = self.client.post('/api/v1/login/', {'phone': '9001112233'}, content_type='application/json')
+            otp = int(response.json()['detail'].split()[-1])
+            response = self.client.post('/api/v1/login/9001112233/', {'otp': otp}, content_type='application/json')
+        self.assertEqual(response.json(), {'detail': 'login successful'})
+        self.assertIsNone(Profile.objects.get(user__phone='9001112233').otp)
+
+
+class InviteFilterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.invite = get_user_model().objects.create_phone_user('9001112233').Profile.invite
+        self.filter = InviteFilter()
+        patcher = mock.patch('accounts.invite_filter._invite_filter', self.filter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_negatives_do_not_touch_the_database(self):
+        self.assertTrue(invite_exists(self.invite))  # загрузка
+        with self.assertNumQueries(0):
+            self.assertFalse(invite_exists('zzzzzz'))
+            self.assertFalse(invite_exists('Не код'))
+        with self.assertNumQueries(1):
+            self.assertTrue(invite_exists(self.invite))
+
+    def test_codes_are_kept_fresh(self):
+        self.filter.might_exist('zzzzzz')
+        invite = get_user_model().objects.create_phone_user('9001112234').Profile.invite  # сигнал
+        self.assertTrue(self.filter.might_exist(invite))
+        # профиль из другого процесса: строка в базе и новая версия в кэше
+        user = get_user_model().objects.create_user('9001112235')
+        Profile.objects.bulk_create([Profile(user=user, invite='zzzzzz')])
+        cache.set(VERSION_KEY, 1)
+        self.assertTrue(self.filter.might_exist('zzzzzz'))
+        self.assertEqual(self.filter.stats()['syncs'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.filter(user__phone='9001112234').delete()
+        self.assertFalse(self.filter.might_exist(invite))
+
+    def test_lower_id_committed_later_is_synced(self):
+        self.filter.might_exist('zzzzzz')
+        # загрузка была давно: окно после неё прошло
+        self.filter.loaded_at -= 10
+        self.filter.checkpoints = deque((moment - 10, last_id) for moment, last_id in self.filter.checkpoints)
+        last_id = Profile.objects.order_by('-id').values_list('id', flat=True).first()
+        users = [get_user_model().objects.create_user(phone) for phone in ('9001112234', '9001112235')]
+        # транзакции двух регистраций: с большим id фиксируется первой
+        Profile.objects.bulk_create([Profile(id=last_id + 2, user=users[1], invite='hhhhhh')])
+        cache.set(VERSION_KEY, 1)
+        self.assertTrue(self.filter.might_exist('hhhhhh'))
+        Profile.objects.bulk_create([Profile(id=last_id + 1, user=users[0], invite='llllll')])
+        cache.set(VERSION_KEY, 2)
+        self.assertTrue(self.filter.might_exist('llllll'))
+        self.assertFalse(self.filter.might_exist('yyyyyy'))
+
+    def test_unsorted_rows_are_sorted(self):
+        self.filter.build([(1, 'zzzzzz'), (2, '000001'), (3, 'AB-CD'), (4, 'abc123')])
+        self.assertEqual(list(self.filter.codes), sorted(self.filter.codes))
+        self.assertEqual([code in self.filter for code in ('000001', 'abc123', 'AB-CD', 'abc124')],
+                         [True, True, True, False])
+
+
+class CleanupExpiredTest(TestCase):
+
+    def setUp(self):
+        old = timezone.now() - datetime.timedelta(seconds=max(settings.OTP_LIFETIME, settings.OTP_RETRY_TIMEOUT) + 1)
+        for num in range(5):
+            get_user_model().objects.create_phone_user(f'900111223{num}')
+        Profile.objects.update(otp=1234, otptime=old, otpattempts=1)
+        get_otp_store().issue('9001112234')  # свежий код остаётся
+        Session.objects.bulk_create(Session(session_key=f'expired{num}', session_data='', expire_date=old)
+                                    for num in range(3))
+        Session.objects.create(session_key='alive', session_data='', expire_date=timezone.now() + datetime.timedelta(1))
+        self.checkpoint = tempfile.mktemp(suffix='.json')
+
+    def cleanup(self):
+        call_command('cleanup_expired', batch_size=2, sleep=0, checkpoint=self.checkpoint, stdout=io.StringIO())
+
+    def assertCleaned(self):
+        self.assertEqual(list(Profile.objects.filter(otptime__isnull=False).values_list('user__phone', flat=True)),
+                         ['9001112234'])
+        self.assertEqual(Profile.objects.filter(otp__isnull=False).count(), 1)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['alive'])
+
+    def test_expired_rows_are_cleaned_in_batches(self):
+        self.cleanup()
+        self.assertCleaned()
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        with mock.patch('time.sleep', side_effect=KeyboardInterrupt):
+            self.cleanup()
+        self.assertEqual(Profile.objects.filter(otptime__isnull=False).count(), 3)
+        with open(self.checkpoint) as stream:
+            self.assertEqual(len(json.load(stream)['otp']['after']), 2)
+        with mock.patch('accounts.cleanup.ExpiredOtp.batch', wraps=SWEEPS['otp'].batch) as batch:
+            self.cleanup()
+        self.assertIsNotNone(batch.call_args_list[0].args[1])  # не с начала
+        self.assertCleaned()
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+@mock.patch.object(settings, 'SERVICE_TOKENS', ['service-token'])
+class ProfileEventsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self, after=0, **params):
+        response = self.client.get('/api/v1/events/', {'after': after, **params},
+                                   headers={'Authorization': 'Bearer service-token'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_feed_is_for_service_clients_only(self):
+        self.assertEqual(self.client.get('/api/v1/events/').status_code, 403)
+        self.assertEqual(self.client.get('/api/v1/events/', headers={'Authorization': 'Bearer wrong'}).status_code,
+                         403)
+        user = get_user_model().objects.create_phone_user('9001112233')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/v1/events/').status_code, 403)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get('/api/v1/events/').status_code, 200)
+
+    def test_changes_are_recorded_in_their_transaction(self):
+        inviter = get_user_model().objects.create_phone_user('9001112233')
+        self.client.post('/api/v1/login/', {'phone': '9001112234'}, content_type='application/json')
+        otp = Profile.objects.get(user__phone='9001112234').otp
+        self.client.post('/api/v1/login/9001112234/', {'otp': otp}, content_type='application/json')
+        self.client.patch('/api/v1/profile/', {'phone': '9001112234', 'first_name': 'Иван',
+                                               'invited': inviter.Profile.invite}, content_type='application/json')
+        feed = self.feed()
+        self.assertEqual([(event['kind'], event['phone']) for event in feed['events']], [
+            (ProfileEvent.PROFILE_CREATED, '9001112233'), (ProfileEvent.PROFILE_CREATED, '9001112234'),
+            (ProfileEvent.LOGIN, '9001112234'), (ProfileEvent.PROFILE_CHANGED, '9001112234'),
+            (ProfileEvent.INVITED_SET, '9001112234')])
+        self.assertEqual(feed['events'][3]['data'], {'first_name': 'Иван'})
+        self.assertEqual(self.feed(feed['next']), {'events': [], 'next': feed['next']})
+        with mock.patch('accounts.events.ProfileEvent.objects.create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                get_user_model().objects.create_phone_user('9001112235')
+        self.assertFalse(get_user_model().objects.filter(phone='9001112235').exists())
+
+    def test_fresh_gap_holds_the_cursor(self):
+        first = ProfileEvent.objects.create(kind=ProfileEvent.LOGIN, phone='9001112233')
+        ProfileEvent.objects.create(id=first.id + 2, kind=ProfileEvent.LOGIN, phone='9001112233')
+        self.assertEqual(len(self.feed()['events']), 1)
+        ProfileEvent.objects.filter(id=first.id + 2).update(
+            created=timezone.now() - datetime.timedelta(seconds=settings.EVENTS_SETTLE_SECONDS + 1))
+        self.assertEqual(self.feed()['next'], first.id + 2)
+
+
+class EventsLongPollTest(TransactionTestCase):
+
+    def test_long_poll_wakes_up_on_new_events(self):
+        cache.clear()
+
+        def wait():
+            try:
+                return wait_for_events(0, 10, 5)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            waiting = executor.submit(wait)
+            time.sleep(0.1)
+            ProfileEvent.objects.create(kind=ProfileEvent.LOGIN, phone='9001112233')
+            cache.set(EVENTS_VERSION_KEY, 1)  # как при фиксации в другом процессе
+            start = time.monotonic()
+            self.assertEqual(len(waiting.result()), 1)
+        self.assertLess(time.monotonic() - start, 2)
+
+
+class OtpVerifyConcurrencyTest(TransactionTestCase):
+
+    def test_parallel_guesses_get_no_extra_attempts(self):
+        get_user_model().objects.create_phone_user('9001112233')
+        store = DbOtpStore()
+        otp = store.issue('9001112233')
+
+        def guess(num):
+            try:
+                return store.verify('9001112233', otp + 1 + num)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(guess, range(32)))
+        # как и раньше, последняя из OTP_ATTEMPTS попыток уже отвечает "исчерпано"
+        self.assertEqual(results.count(OTP_INVALID), settings.OTP_ATTEMPTS - 1)
+        self.assertEqual(results.count(OTP_EXHAUSTED), 32 - (settings.OTP_ATTEMPTS - 1))
+
+
+class RateLimitTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_limiters_block_over_limit(self):
+        for limiter in (CacheRateLimiter(), LocalRateLimiter()):
+            self.assertEqual([limiter.hit('key', 3, 60) for _ in range(3)], [0, 0, 0])
+            retry_after = limiter.hit('key', 3, 60)
+            self.assertGreater(retry_after, 0)
+            self.assertLessEqual(retry_after, 60)
+            self.assertEqual(limiter.hit('other', 3, 60), 0)
+
+    @mock.patch.dict(settings.RATELIMITS, {'otp_issue': {'ip': (2, 60)}})
+    def test_ip_spraying_phones_gets_retry_after(self):
+        statuses = [self.client.post('/api/v1/login/', {'phone': f'900111223{num}'},
+                                     content_type='application/json') for num in range(3)]
+        self.assertEqual([response.status_code for response in statuses], [200, 200, 429])
+        self.assertIn('Retry-After', statuses[-1])
+        self.assertEqual(Profile.objects.count(), 2)
+
+    @mock.patch.dict(settings.RATELIMITS, {'otp_verify': {'phone': (1, 60)}})
+    def test_html_verify_is_limited_by_phone(self):
+        self.client.post('/otp/9001112233/', {'otp': 1})
+        response = self.client.post('/otp/9001112233/', {'otp': 1})
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'Слишком много запросов', status_code=429)
+
+
+class AsyncAPITest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+
+    async def call(self, view, method, data, **kwargs):
+        request = getattr(self.factory, method)('/', data, content_type='application/json')
+        request.session = SessionStore()
+        response = await view.as_view()(request, **kwargs)
+        return response.status_code, json.loads(response.content)
+
+    async def test_login_flow(self):
+        code, data = await self.call(AsyncLoginOrCreateAPIView, 'post', {'phone': '9001112233'})
+        self.assertEqual(code, 200)
+        otp = int(data['detail'].split()[-1])
+        code, data = await self.call(AsyncLoginOTPAPIView, 'post', {'otp': otp}, phone='9001112233')
+        self.assertEqual((code, data), (200, {'detail': 'login successful'}))
+
+    async def test_profile_create_and_read(self):
+        inviter = await sync_to_async(get_user_model().objects.create_phone_user)('9001112233')
+        code, data = await self.call(AsyncProfileAPIUpdate, 'put',
+                                     {'phone': '9001112234', 'first_name': 'Иван', 'invited': inviter.Profile.invite})
+        self.assertEqual((code, data['first_name']), (200, 'Иван'))
+        code, data = await self.call(AsyncProfileAPIUpdate, 'post', {'phone': '9001112233'})
+        self.assertEqual((data['followers'], data['followers_count']), (['9001112234'], 1))
+        code, data = await self.call(AsyncProfileAPIUpdate, 'post', {'phone': '9009999999'})
+        self.assertEqual(code, 404)
+
+
+class ProfileAdminTest(TestCase):
+
+    def setUp(self):
+        admin = get_user_model().objects.create_superuser('9000000000', 'password')
+        self.client.force_login(admin)
+        self.inviter = get_user_model().objects.create_phone_user('9001110000')
+        for num in range(1, 6):
+            get_user_model().objects.create_phone_user(f'900111000{num}', invited=self.inviter.Profile.invite)
+        rebuild_follower_counters()
+
+    def changelist(self, **params):
+        response = self.client.get('/admin/accounts/profile/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_list_has_no_per_row_queries(self):
+        self.changelist()  # сессия и пользователь попадают в кэш
+        with CaptureQueriesContext(connection) as few:
+            self.changelist()
+        get_user_model().objects.create_phone_user('9001110009', invited=self.inviter.Profile.invite)
+        with CaptureQueriesContext(connection) as more:
+            self.changelist()
+        self.assertEqual(len(few), len(more))
+
+    def test_phone_prefix_and_invite_search(self):
+        self.assertEqual(self.changelist(q='900111').result_count, 6)
+        self.assertEqual(list(self.changelist(q='9001110003').result_list),
+                         [Profile.objects.get(user__phone='9001110003')])
+        self.assertEqual([profile.user_id for profile in self.changelist(q=self.inviter.Profile.invite).result_list],
+                         [self.inviter.pk])
+        self.assertEqual(self.changelist(q='Иван').result_count, 0)
+
+    def test_filters(self):
+        self.assertEqual(self.changelist(invited_by=self.inviter.Profile.invite).result_count, 5)
+        get_otp_store().issue('9001110002')
+        self.assertEqual([profile.user.phone for profile in self.changelist(pending_otp='1').result_list],
+                         ['9001110002'])
+
+    def test_keyset_pages(self):
+        ids = sorted(Profile.objects.values_list('pk', flat=True))
+        with mock.patch('accounts.admin.ProfileAdmin.list_per_page', 4):
+            first = self.changelist(after='')
+            self.assertEqual([profile.pk for profile in first.result_list], ids[:4])
+            second = self.changelist(after=first.next_after)
+        self.assertEqual([profile.pk for profile in second.result_list], ids[4:])
+        self.assertIsNone(second.next_after)
@@ -1,10 +1,24 @@
 from django.urls import path
 
-from accounts import views
+from accounts import views, async_views
+from config import settings
 
 
+if settings.API_ASYNC:
+    login_view = async_views.AsyncLoginOrCreateAPIView
+    otp_login_view = async_views.AsyncLoginOTPAPIView
+    profile_view = async_views.AsyncProfileAPIUpdate
+else:
+    login_view = views.LoginOrCreateAPIView
+    otp_login_view = views.LoginOTPAPIView
+    profile_view = views.ProfileAPIUpdate
+
 urlpatterns = [
-    path('login/', views.LoginOrCreateAPIView.as_view()),
-    path('login/<int:phone>/', views.LoginOTPAPIView.as_view(), name='OTPLogin'),
-    path('profile/', views.ProfileAPIUpdate.as_view()),
+    path('login/', login_view.as_view()),
+    path('login/<int:phone>/', otp_login_view.as_view(), name='OTPLogin'),
+    path('profile/', profile_view.as_view()),
+    path('profiles/bulk/', views.ProfileBulkAPIView.as_view(), name='profiles-bulk'),
+    path('events/', views.EventsAPIView.as_view(), name='events'),
+    path('followers/<int:phone>/', views.FollowersAPIView.as_view(), name='followers'),
+    path('referrals/<int:phone>/', views.ReferralTreeAPIView.as_view(), name='referrals'),
 ]
@@ -1,9 +1,13 @@
-import random
+import time
 from typing import NoReturn
-from string import ascii_lowercase, digits
 
+from asgiref.sync import sync_to_async
 from django.core.validators import RegexValidator
 
+from accounts.delivery import get_delivery_queue, get_transport
+from accounts.metrics import observe
+from config import settings
+
 phone_regex = RegexValidator(regex=r'^9\d{9}$',
                              message="Введите мобильный номер телефона в формате: '9001112233' - 9 цифр подряд, без кода страны. Только Россия!")
 
@@ -16,16 +20,30 @@ class OtpSender:
         self.phone = phone
         self.otp = otp
 
-    def send_otp_on_phone(self) -> NoReturn:
-        print(f"===> You one time password {self.otp} must be send to {self.phone}")  # bung for this func
-
-
-def generate_code(length=6) -> str:
-    result = ''
-    for num in range(0, length):
-        if random.choice((True, False, False)):
-            result += random.choice(digits)
-        else:
-            result += random.choice(ascii_lowercase)
-    return result
-
+    def send_otp_on_phone(self) -> bool:
+        """Поставить код в очередь отправки. False - очередь переполнена."""
+        start = time.perf_counter()
+        if settings.OTP_DELIVERY_ASYNC:
+            queued = get_delivery_queue().enqueue(self.phone, self.otp)
+            observe('otp_send_duration_seconds', time.perf_counter() - start, mode='queue')
+            return queued
+        get_transport().send_batch([(self.phone, self.otp)])
+        observe('otp_send_duration_seconds', time.perf_counter() - start, mode='inline')
+        return True
+
+    async def asend_otp_on_phone(self) -> bool:
+        """То же для асинхронных обработчиков: цикл событий не блокируется."""
+        start = time.perf_counter()
+        if settings.OTP_DELIVERY_ASYNC:
+            queued = get_delivery_queue().enqueue(self.phone, self.otp, block=False)
+            observe('otp_send_duration_seconds', time.perf_counter() - start, mode='queue')
+            return queued
+        await sync_to_async(get_transport().send_batch)([(self.phone, self.otp)])
+        observe('otp_send_duration_seconds', time.perf_counter() - start, mode='inline')
+        return True
+
+
+def generate_code() -> str:
+    """Новый уникальный пригласительный код (значение по умолчанию для Profile.invite)."""
+    from accounts.invites import get_invite_allocator  # invites импортирует модели, а модели - этот модуль
+    return get_invite_allocator().allocate()
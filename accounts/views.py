@@ -1,12 +1,13 @@
-import datetime
-import random
+import json
 
 from django.contrib.auth import get_user_model, login, logout
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.handlers.wsgi import WSGIRequest
-from django.forms import model_to_dict
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
 from django.views.generic import UpdateView
 
 from rest_framework import status, generics, permissions
@@ -14,32 +15,28 @@ from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.authentication import SessionAuthentication
 
+from accounts import metrics
+from accounts.avatars import absolute_avatar_url
+from accounts.backends import forget_user
+from accounts.events import read_events, wait_for_events, event_data
 from accounts.forms import ProfileUserForm
-from accounts.serializers import OTPSerializer, LoginUserSerializer, ProfileOutUserSerializer, ProfileInUserSerializer
+from accounts.invite_filter import invite_exists
+from accounts.loaders import ProfileLoader, get_profile_loader, load_profiles
+from accounts.pagination import FollowersPagination
+from accounts.permissions import IsService, is_service_request
+from accounts.profile_cache import get_profile_cache, profile_data, absolute_profile_data, not_modified
+from accounts.ratelimit import ratelimit
+from accounts.referrals import attach_follower, referral_subtree
+from accounts.routers import read_from_replica
+from accounts.serializers import OTPSerializer, LoginUserSerializer, ProfileOut, ProfileInUserSerializer, \
+    FollowerSerializer, ProfileBulkSerializer, EventsQuerySerializer
+from accounts.signup import login_or_create, InviteNotFound
 from accounts.utils import OtpSender
+from accounts.otp_store import get_otp_store, OTP_OK, OTP_INVALID, OTP_EXHAUSTED
 from accounts.models import Profile
 from config import settings
 
 
-def get_invite_code(user) -> str:
-    return Profile.objects.get(user=user).invite
-
-
-def get_ava_url(user) -> str:
-    if ava := Profile.objects.get(user=user).avatar:
-        return ava.url
-    else:
-        return "None"
-
-
-def get_invited(user) -> str:
-    return Profile.objects.get(user=user).invited
-
-
-def get_all_followers(invite_code) -> list:
-    return list(Profile.objects.filter(invited=invite_code).all().values('user__phone'))
-
-
 class CsrfExemptSessionAuthentication(SessionAuthentication):
     def enforce_csrf(self, request):
         return None
@@ -56,43 +53,27 @@ class MyApiView(generics.GenericAPIView):
             return {}
 
 
+@ratelimit('otp_issue', template='accounts/login.html')
 def login_view(request: WSGIRequest):
     error = False
     message = ''
     if request.method == 'POST':
         phone = request.POST.get('phone')
         invited = request.POST.get('invited')
-        user = get_user_model().objects.filter(phone=phone).first()
-        profile = Profile.objects.filter(user=user).first()
-        valid_invite = Profile.objects.filter(invite=invited)
-        if not profile:  # если профиля с таким номером нет, то проверяем приглашение
-            if valid_invite or not invited:  # если приглашение корректное или его нет
-                try:
-                    user = get_user_model().objects.create(phone=phone)
-                    profile = Profile.objects.create(user=user, invited=invited)
-                except Exception as err:
-                    error = True
-                    message = f'Ошибка создания записи {err}'
-            else:  # если не корректное приглашение
-                error = True
-                message = "Введён не корректный пригласительный код!"
-        if error:
-            pass
+        try:
+            user, otp = login_or_create(phone, invited or None)
+        except InviteNotFound:
+            error = True
+            message = "Введён не корректный пригласительный код!"
+        except Exception as err:
+            error = True
+            message = f'Ошибка создания записи {err}'
         else:
-            if last_otp_time := profile.otptime:
-                timedelta = datetime.datetime.utcnow() - last_otp_time.replace(tzinfo=None)
-            else:
-                timedelta = datetime.timedelta(seconds=settings.OTP_RETRY_TIMEOUT+1)
-            if not last_otp_time or timedelta.seconds > settings.OTP_RETRY_TIMEOUT:
-                if not profile.invited and valid_invite:
-                    profile.invited = invited
-                profile.otp = random.randint(999, 9999)
-                profile.otptime = datetime.datetime.utcnow()
-                profile.otpattempts = settings.OTP_ATTEMPTS
-                profile.save()
-                sender = OtpSender(user.phone, profile.otp).send_otp_on_phone()
-
-                return redirect(f'/otp/{user.phone}')
+            if otp:
+                if OtpSender(user.phone, otp).send_otp_on_phone():
+                    return redirect(f'/otp/{user.phone}')
+                error = True
+                message = "Сервис отправки SMS перегружен. Попробуйте позже!"
             else:
                 error = True
                 message = "Превышено время повторной выдачи пароля. Попробуйте позже!"
@@ -108,16 +89,24 @@ class ProfileUser(LoginRequiredMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context = super(ProfileUser, self).get_context_data(**kwargs)
-        context['invite'] = get_invite_code(self.request.user)
-        context['followers'] = get_all_followers(context['invite'])
-        context['urlava'] = f"{self.request.scheme}://{self.request.get_host()}{get_ava_url(self.request.user)}"
+        loader = get_profile_loader(self.request)
+        with read_from_replica(loader.phone):
+            context['invite'] = loader.invite
+            context['followers'] = loader.followers
+            context['followers_count'] = loader.followers_count
+        context['urlava'] = f"{self.request.scheme}://{self.request.get_host()}{loader.ava_url}"
         return context
 
     def get_initial(self):
         initial = super(ProfileUser, self).get_initial()
-        initial['invited'] = get_invited(self.request.user)
+        initial['invited'] = get_profile_loader(self.request).invited
         return initial
 
+    def get_form_kwargs(self):
+        kwargs = super(ProfileUser, self).get_form_kwargs()
+        kwargs['loader'] = get_profile_loader(self.request)
+        return kwargs
+
     def get_success_url(self):
         return reverse_lazy('profile', args=[self.request.user.pk])
 
@@ -125,36 +114,37 @@ class ProfileUser(LoginRequiredMixin, UpdateView):
         return self.request.user
 
     def form_valid(self, form):
-        user = form.save()
-        invited_code = form.data.get('invited')
-        if invited_code:
-            profile = Profile.objects.get(user=user)
-            profile.invited = invited_code
-            profile.save()
+        # изменения и их события в ленте (accounts.events) - одной транзакцией
+        with transaction.atomic():
+            user = form.save()
+            invited_code = form.data.get('invited')
+            # профиль из кэша пользователя (CachedUserBackend) может быть устаревшим: счётчики
+            # последователей меняются update() без сигналов - для записи читаем строку из базы
+            profile = Profile.objects.select_for_update().get(user=user)
+            if invited_code and not profile.invited:
+                profile.invited = invited_code
+                profile.save(update_fields=['invited'])
+                attach_follower(profile)
         return redirect('profile')
 
 
+@ratelimit('otp_verify', template='accounts/otp.html')
 def otp_request(request: WSGIRequest, phone):
     error = False
     message = ''
     if request.method == 'POST':
         otp = int(request.POST.get('otp'))
-        profile = Profile.objects.get(user=get_user_model().objects.get(phone=phone))
-        profile.otpattempts -= 1
-        timedelta = datetime.datetime.utcnow() - profile.otptime.replace(tzinfo=None)
         try:
-            profile.save()
-            if timedelta.seconds < settings.OTP_LIFETIME:
-                if profile.otpattempts > 0:
-                    if otp == profile.otp:
-                        login(request, profile.user)
-                        return redirect('/profile/')
-                    else:
-                        error = True
-                        message = f'Введены не корректные данные'
-                else:
-                    error = True
-                    message = f'Исчерпано количество попыток! <a href="{reverse_lazy("home")}">Ещё раз</a>'
+            result = get_otp_store().verify(phone, otp)
+            if result == OTP_OK:
+                login(request, get_user_model().objects.get(phone=phone))
+                return redirect('/profile/')
+            elif result == OTP_INVALID:
+                error = True
+                message = f'Введены не корректные данные'
+            elif result == OTP_EXHAUSTED:
+                error = True
+                message = f'Исчерпано количество попыток! <a href="{reverse_lazy("home")}">Ещё раз</a>'
             else:
                 error = True
                 message = f'Время жизни пароля истекло! <a href="{reverse_lazy("home")}">Ещё раз</a>'
@@ -166,13 +156,25 @@ def otp_request(request: WSGIRequest, phone):
 
 
 def logout_view(request: WSGIRequest):
+    forget_user(request.user.pk)
     logout(request)
     return redirect('/')
 
 
+def metrics_view(request: WSGIRequest):
+    """
+    Метрики этого процесса для Prometheus: каждый воркер отдаёт свои. Пути и задержки
+    запросов наружу не показываем - только служебным клиентам (bearer_token в scrape_config).
+    """
+    if not is_service_request(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # ============== API handlers =================
 
 
+@method_decorator(ratelimit('otp_verify'), name='post')
 class LoginOTPAPIView(MyApiView):
     serializer_class = OTPSerializer
     queryset = Profile.objects.all()
@@ -180,20 +182,16 @@ class LoginOTPAPIView(MyApiView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        profile = self.queryset.get(user=get_user_model().objects.get(phone=kwargs.get('phone')))
-        profile.otpattempts -= 1
-        timedelta = datetime.datetime.utcnow() - profile.otptime.replace(tzinfo=None)
+        phone = kwargs.get('phone')
         try:
-            profile.save()
-            if timedelta.seconds < settings.OTP_LIFETIME:
-                if profile.otpattempts > 0:
-                    if int(request.data.get('otp')) == profile.otp:
-                        login(self.request, user=profile.user)
-                    else:
-                        return Response({'detail': 'Не корректный пароль!'},
-                                        status=status.HTTP_401_UNAUTHORIZED)
-                else:
-                    return Response({'detail': 'Исчерпано количество попыток!'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            result = get_otp_store().verify(phone, int(request.data.get('otp')))
+            if result == OTP_OK:
+                login(self.request, user=get_user_model().objects.get(phone=phone))
+            elif result == OTP_INVALID:
+                return Response({'detail': 'Не корректный пароль!'},
+                                status=status.HTTP_401_UNAUTHORIZED)
+            elif result == OTP_EXHAUSTED:
+                return Response({'detail': 'Исчерпано количество попыток!'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
             else:
                 return Response({'detail': 'Время жизни пароля истекло!'}, status=status.HTTP_408_REQUEST_TIMEOUT)
         except Exception as err:
@@ -203,6 +201,7 @@ class LoginOTPAPIView(MyApiView):
         return Response({'detail': 'login successful'}, status=status.HTTP_200_OK, headers=headers)
 
 
+@method_decorator(ratelimit('otp_issue'), name='post')
 class LoginOrCreateAPIView(MyApiView):
     serializer_class = LoginUserSerializer
     queryset = Profile.objects.all()
@@ -211,31 +210,20 @@ class LoginOrCreateAPIView(MyApiView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         phone = serializer.data.get('phone')
-        user = get_user_model().objects.filter(phone=phone).first()
-        profile = Profile.objects.filter(user=user).first()
-        if not profile:
-            try:
-                user = get_user_model().objects.create(phone=phone)
-                profile = Profile.objects.create(user=user)
-            except Exception as err:
-                return Response({'detail': f'Ошибка регистрации {err}'}, status=status.HTTP_400_BAD_REQUEST)
-        if last_otp_time := profile.otptime:
-            timedelta = datetime.datetime.utcnow() - last_otp_time.replace(tzinfo=None)
-        else:
-            timedelta = datetime.timedelta(seconds=settings.OTP_RETRY_TIMEOUT+1)
-        if not last_otp_time or timedelta.seconds > settings.OTP_RETRY_TIMEOUT:
-            profile.otp = random.randint(999, 9999)
-            profile.otptime = datetime.datetime.utcnow()
-            profile.otpattempts = settings.OTP_ATTEMPTS
-            profile.save()
-            sender = OtpSender(user.phone, profile.otp).send_otp_on_phone()
-
+        try:
+            user, otp = login_or_create(phone)
+        except Exception as err:
+            return Response({'detail': f'Ошибка регистрации {err}'}, status=status.HTTP_400_BAD_REQUEST)
+        if otp:
+            if not OtpSender(user.phone, otp).send_otp_on_phone():
+                return Response({'detail': 'Сервис отправки SMS перегружен. Попробуйте позже!'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
         else:
             return Response({'detail': 'Превышено время повторной выдачи пароля. Попробуйте позже!'},
                             status=status.HTTP_429_TOO_MANY_REQUESTS)
         headers = self.get_success_headers(serializer.data)
 
-        return Response({'detail': f'your OTP is {profile.otp}',
+        return Response({'detail': f'your OTP is {otp}',
                          'login_url': f'{reverse_lazy("OTPLogin", args=[phone])}'},
                         status=status.HTTP_200_OK, headers=headers)
 
@@ -248,23 +236,23 @@ class ProfileAPIUpdate(MyApiView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         phone = serializer.data.get('phone')
-        user = get_user_model().objects.filter(phone=phone).first()
-        profile = Profile.objects.filter(user=user).first()
-        if profile:
-            invite = get_invite_code(user)
-            followers = [flw.get('user__phone') for flw in get_all_followers(invite)]
-        else:
+        avatar_size = serializer.data.get('avatar_size')
+
+        def build():
+            with read_from_replica(phone):
+                if request.user.is_authenticated and request.user.phone == phone:
+                    return profile_data(get_profile_loader(request), avatar_size)
+                return profile_data(ProfileLoader(phone), avatar_size)
+
+        found = get_profile_cache().fetch(phone, avatar_size or '', build)
+        if found is None:
             return Response({'detail': 'Пользователь не найден!'},
                             status=status.HTTP_404_NOT_FOUND)
-        headers = self.get_success_headers(serializer.data)
-        merged_data = model_to_dict(user) | model_to_dict(profile) | {'phone': str(user), 'followers': followers}
-        out_serializer = ProfileOutUserSerializer(data=merged_data)
-        if out_serializer.is_valid(raise_exception=False):
-            return Response(out_serializer.validated_data,
-                        status=status.HTTP_200_OK, headers=headers)
-        else:
-            return Response({'detail': 'Ошибка записи в базе'},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR, headers=headers)
+        data, etag = found
+        headers = self.get_success_headers(serializer.data) | {'ETag': etag}
+        if not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(absolute_profile_data(request, data), status=status.HTTP_200_OK, headers=headers)
 
     def put(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -276,12 +264,14 @@ class ProfileAPIUpdate(MyApiView):
         last_name = serializer.data.get('last_name', None)
         user = get_user_model().objects.filter(phone=phone).first()
         profile = Profile.objects.filter(user=user).first()
-        valid_invite = Profile.objects.filter(invite=invited)
+        valid_invite = invited and invite_exists(invited)
         if not profile:  # если профиля с таким номером нет, то проверяем приглашение
             if valid_invite or not invited:  # если приглашение корректное или его нет
                 try:
-                    user = get_user_model().objects.create(phone=phone, email=email, first_name=first_name, last_name=last_name)
-                    profile = Profile.objects.create(user=user, invited=invited)
+                    user = get_user_model().objects.create_phone_user(phone, invited=invited or None, email=email or '',
+                                                                      first_name=first_name or '',
+                                                                      last_name=last_name or '')
+                    profile = user.Profile
                 except Exception as err:
                     return Response({'detail': f'Ошибка внесения пользователя в систему {err}'},
                                     status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -293,14 +283,8 @@ class ProfileAPIUpdate(MyApiView):
                             status=status.HTTP_409_CONFLICT)
 
         headers = self.get_success_headers(serializer.data)
-        merged_data = model_to_dict(user) | model_to_dict(profile) | {'phone': str(user), 'followers': []}
-        out_serializer = ProfileOutUserSerializer(data=merged_data)
-        if out_serializer.is_valid(raise_exception=False):
-            return Response(out_serializer.validated_data,
-                        status=status.HTTP_200_OK, headers=headers)
-        else:
-            return Response({'detail': 'Ошибка записи в базе'},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR, headers=headers)
+        out = ProfileOut.from_instances(user, profile)
+        return Response(out.data, status=status.HTTP_200_OK, headers=headers)
 
     def patch(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -310,9 +294,10 @@ class ProfileAPIUpdate(MyApiView):
         new_email = serializer.data.get('email')
         new_first_name = serializer.data.get('first_name')
         new_last_name = serializer.data.get('last_name')
+        avatar_size = serializer.data.get('avatar_size')
         user = get_user_model().objects.filter(phone=phone).first()
         profile = Profile.objects.filter(user=user).first()
-        valid_invite = Profile.objects.filter(invite=new_invited)
+        valid_invite = new_invited and invite_exists(new_invited)
         if new_invited or new_email or new_first_name or new_last_name:
             if profile:
                 if str(new_invited) == str(profile.invite):
@@ -323,9 +308,17 @@ class ProfileAPIUpdate(MyApiView):
                         if new_email: user.email = new_email
                         if new_first_name: user.first_name = new_first_name
                         if new_last_name: user.last_name = new_last_name
-                        if new_invited and not profile.invited: profile.invited = new_invited
-                        user.save()
-                        profile.save()
+                        attach = bool(new_invited and not profile.invited)
+                        if attach: profile.invited = new_invited
+                        # только изменённые поля: полная запись вернула бы прочитанные ранее
+                        # otpattempts и счётчики последователей, которые меняются параллельно
+                        changed = [field for field, value in (('email', new_email), ('first_name', new_first_name),
+                                                              ('last_name', new_last_name)) if value]
+                        with transaction.atomic():
+                            if changed: user.save(update_fields=changed)
+                            if attach:
+                                profile.save(update_fields=['invited'])
+                                attach_follower(profile)
                     except Exception as err:
                         return Response({'detail': f'Ошибка изменения пользователя в системе {err}'},
                                         status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -336,13 +329,103 @@ class ProfileAPIUpdate(MyApiView):
                 return Response({'detail': 'Такого пользователя не существует!'},
                                 status=status.HTTP_404_NOT_FOUND)
 
-        followers = [flw.get('user__phone') for flw in get_all_followers(profile.invite)]
+        loader = ProfileLoader(phone)
         headers = self.get_success_headers(serializer.data)
-        merged_data = model_to_dict(user) | model_to_dict(profile) | {'phone': str(user), 'followers': followers}
-        out_serializer = ProfileOutUserSerializer(data=merged_data)
-        if out_serializer.is_valid(raise_exception=False):
-            return Response(out_serializer.validated_data,
-                        status=status.HTTP_200_OK, headers=headers)
-        else:
-            return Response({'detail': 'Ошибка записи в базе'},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR, headers=headers)
+        out = ProfileOut.from_instances(user, profile, loader.follower_phones, loader.followers_count,
+                                        absolute_avatar_url(request, profile, avatar_size))
+        return Response(out.data, status=status.HTTP_200_OK, headers=headers)
+
+
+class ProfileBulkAPIView(MyApiView):
+    """
+    Профили многих номеров одним запросом: {"phones": [...], "followers": false, "avatar_size": 256}.
+    Ответ - NDJSON, строка на номер в порядке запроса (для неизвестного - phone и detail);
+    номера читаются пачками по PROFILE_BULK_CHUNK, так что в памяти не больше одной пачки.
+    Для внутренних сервисов: контакты тысяч пользователей за запрос - только служебным клиентам.
+    """
+    serializer_class = ProfileBulkSerializer
+    permission_classes = (IsService,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        phones = list(dict.fromkeys(serializer.validated_data['phones']))
+        with_followers = serializer.validated_data['followers']
+        avatar_size = serializer.validated_data.get('avatar_size')
+
+        def lines():
+            for offset in range(0, len(phones), settings.PROFILE_BULK_CHUNK):
+                # реплика - только на время запросов пачки, а не между отдачами ответа
+                with read_from_replica(None):
+                    found = load_profiles(phones[offset:offset + settings.PROFILE_BULK_CHUNK], with_followers)
+                chunk = []
+                for phone, user, followers, followers_count in found:
+                    if user is None:
+                        data = {'phone': phone, 'detail': 'Пользователь не найден!'}
+                    else:
+                        data = ProfileOut.from_instances(user, user.Profile, followers, followers_count,
+                                                         absolute_avatar_url(request, user.Profile, avatar_size)).data
+                    chunk.append(json.dumps(data, ensure_ascii=False))
+                yield '\n'.join(chunk) + '\n'
+
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
+
+
+class EventsAPIView(MyApiView):
+    """
+    Лента событий профилей по курсору: GET ?after=<seq>&limit=N&wait=<s>. В ответе - события
+    с seq больше after и next - курсор для следующего запроса. С wait при пустой ленте
+    запрос ждёт новых событий до wait секунд (долгий опрос) и занимает на это время поток.
+    В ленте номера, входы и контакты всех пользователей - только для служебных клиентов.
+    """
+    serializer_class = EventsQuerySerializer
+    permission_classes = (IsService,)
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        after, limit, wait = (serializer.validated_data[name] for name in ('after', 'limit', 'wait'))
+        rows = wait_for_events(after, limit, wait) if wait else read_events(after, limit)
+        return Response({'events': [event_data(row) for row in rows], 'next': rows[-1]['id'] if rows else after},
+                        status=status.HTTP_200_OK)
+
+
+class FollowersAPIView(MyApiView, generics.ListAPIView):
+    serializer_class = FollowerSerializer
+    pagination_class = FollowersPagination
+
+    invite = None
+
+    def get_queryset(self):
+        return Profile.objects.filter(invited=self.invite).select_related('user').only('id', 'user__phone')
+
+    def list(self, request, *args, **kwargs):
+        with read_from_replica(kwargs.get('phone')):
+            # неизвестный номер - 404, а не пустая страница, как у пользователя без подписчиков
+            self.invite = Profile.objects.filter(user__phone=kwargs.get('phone')).values_list(
+                'invite', flat=True).first()
+            if self.invite is None:
+                return Response({'detail': 'Пользователь не найден!'},
+                                status=status.HTTP_404_NOT_FOUND)
+            return super().list(request, *args, **kwargs)
+
+
+class ReferralTreeAPIView(MyApiView):
+
+    def get(self, request, *args, **kwargs):
+        try:
+            depth = min(int(request.query_params.get('depth', 1)), settings.REFERRAL_TREE_MAX_DEPTH)
+        except ValueError:
+            return Response({'detail': 'Глубина должна быть числом!'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        with read_from_replica(kwargs.get('phone')):
+            profile = Profile.objects.filter(user__phone=kwargs.get('phone')).first()
+            if not profile:
+                return Response({'detail': 'Пользователь не найден!'},
+                                status=status.HTTP_404_NOT_FOUND)
+            tree = referral_subtree(profile.invite, depth)
+        return Response({'invite': profile.invite,
+                         'followers_direct': profile.followers_direct,
+                         'followers_total': profile.followers_total,
+                         'tree': tree},
+                        status=status.HTTP_200_OK)
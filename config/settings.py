@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "accounts.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -75,10 +77,74 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+# Без POSTGRES_DB - SQLite для разработки. Алиас "replica" - второе подключение к тому же файлу:
+# на нём можно проверить маршрутизацию чтений (accounts.routers) без настоящей реплики,
+# чтения на него идут при SQLITE_REPLICA=1.
+# С POSTGRES_DB - PostgreSQL из окружения:
+#   POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT - основная база;
+#   POSTGRES_REPLICA_HOSTS - реплики через запятую (алиасы replica1, replica2, ...);
+#   POSTGRES_CONN_MAX_AGE - сколько секунд держать постоянное подключение (по умолчанию 60);
+#   POSTGRES_POOL_SIZE - вместо постоянных подключений пул psycopg (нужен psycopg[pool]) такого размера.
+
+if os.environ.get('POSTGRES_DB'):
+    def postgres(host) -> dict:
+        database = {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ['POSTGRES_DB'],
+            "USER": os.environ.get('POSTGRES_USER', ''),
+            "PASSWORD": os.environ.get('POSTGRES_PASSWORD', ''),
+            "HOST": host,
+            "PORT": os.environ.get('POSTGRES_PORT', ''),
+            "CONN_MAX_AGE": int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+        if pool_size := int(os.environ.get('POSTGRES_POOL_SIZE', 0)):
+            # пул и постоянные подключения Django вместе не используются
+            database["CONN_MAX_AGE"] = 0
+            database["OPTIONS"]["pool"] = {"min_size": 1, "max_size": pool_size, "timeout": 10}
+        return database
+
+    DATABASES = {"default": postgres(os.environ.get('POSTGRES_HOST', ''))}
+    for num, host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',')), start=1):
+        DATABASES[f"replica{num}"] = postgres(host.strip()) | {"TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            # транзакции сразу берут блокировку записи: параллельные первые входы
+            # ждут друг друга (timeout), а не падают с "database is locked"
+            "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+            # тесты с потоками (accounts.tests.LoginOrCreateConcurrencyTest) требуют файловой БД
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        },
+        "replica": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {"timeout": 20},
+            "TEST": {"MIRROR": "default"},
+        },
+    }
+    DATABASE_REPLICAS = ['replica'] if os.environ.get('SQLITE_REPLICA') else []
+
+# Чтения профиля и последователей (accounts.routers.read_from_replica) идут на реплики DATABASE_REPLICAS,
+# кроме номеров, данные которых менялись за последние REPLICA_PIN_SECONDS секунд
+
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+
+REPLICA_PIN_CACHE = 'default'
+
+REPLICA_PIN_SECONDS = 5
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# LocMemCache живёт внутри процесса; для нескольких воркеров нужен общий кэш (Redis, Memcached)
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
 
@@ -140,3 +206,175 @@ OTP_ATTEMPTS = 3
 # таймаут между попытками входа (повторной выдачей OTP)
 
 OTP_RETRY_TIMEOUT = 120
+
+# Хранилище одноразовых паролей:
+# 'accounts.otp_store.DbOtpStore' - поля Profile (otp, otptime, otpattempts)
+# 'accounts.otp_store.CacheOtpStore' - кэш Django, без записи в таблицу профилей
+# 'accounts.otp_store.TotpOtpStore' - код вычисляется HMAC от OTP_SECRET, номера и шага OTP_LIFETIME;
+#   при выдаче ничего не пишется, в OTP_CACHE - только счётчик попыток номера
+#   на max(2 * OTP_LIFETIME, OTP_RETRY_TIMEOUT) секунд от первой попытки
+
+OTP_STORE = 'accounts.otp_store.DbOtpStore'
+
+# Ключ HMAC для TotpOtpStore: зная его, можно вычислить код любого номера,
+# поэтому в продакшене задайте отдельное значение, например secrets.token_hex(32)
+
+OTP_SECRET = SECRET_KEY
+
+# Алиас кэша из CACHES для CacheOtpStore
+
+OTP_CACHE = 'default'
+
+# Отправка OTP: транспорт (SMS-шлюз) и фоновая очередь с пакетной отправкой.
+# При OTP_DELIVERY_ASYNC = False код отправляется прямо в потоке запроса
+
+OTP_TRANSPORT = 'accounts.delivery.ConsoleTransport'
+
+OTP_DELIVERY_ASYNC = True
+
+OTP_DELIVERY_QUEUE_SIZE = 10000
+
+OTP_DELIVERY_WORKERS = 2
+
+OTP_DELIVERY_BATCH = 100
+
+OTP_DELIVERY_RETRIES = 3
+
+# Размер страницы последователей (API /api/v1/followers/ и первая страница в профиле)
+
+FOLLOWERS_PAGE_SIZE = 50
+
+# Пакетная выдача профилей (POST /api/v1/profiles/bulk/, ответ - NDJSON): номеров в одном запросе
+# и номеров на один проход по базе
+
+PROFILE_BULK_MAX_PHONES = 10000
+
+PROFILE_BULK_CHUNK = 1000
+
+# Максимальная глубина дерева приглашений в /api/v1/referrals/
+
+REFERRAL_TREE_MAX_DEPTH = 10
+
+# Ключ перестановки пригласительных кодов. Зная ключ, можно перечислить все коды,
+# поэтому в продакшене задайте отдельное значение, например secrets.token_hex(32)
+
+INVITE_CODE_KEY = SECRET_KEY
+
+# Сколько кодов процесс резервирует за одно обращение к счётчику
+
+INVITE_CODE_BLOCK = 500
+
+# Множество пригласительных кодов в памяти процесса (accounts.invite_filter): несуществующий код
+# отвергается без запроса в базу. Версия множества - в кэше INVITE_FILTER_CACHE (общем для процессов),
+# целиком множество перечитывается раз в INVITE_FILTER_RESYNC_SECONDS
+
+INVITE_FILTER_ENABLED = True
+
+INVITE_FILTER_CACHE = 'default'
+
+INVITE_FILTER_RESYNC_SECONDS = 3600
+
+# За сколько секунд фиксируется транзакция создания профиля: столько множество дочитывает
+# профили с меньшими id, чем уже прочитанные (id выдаются при вставке, а видны после фиксации)
+
+INVITE_FILTER_SETTLE_SECONDS = 5
+
+# Очистка истёкших OTP и просроченных сессий (python manage.py cleanup_expired): пачки по CLEANUP_BATCH_SIZE
+# строк с паузой CLEANUP_SLEEP секунд, в режиме --loop - проход раз в CLEANUP_INTERVAL секунд.
+# Курсор прерванного прохода - в файле CLEANUP_CHECKPOINT
+
+CLEANUP_BATCH_SIZE = 1000
+
+CLEANUP_SLEEP = 0.05
+
+CLEANUP_INTERVAL = 300
+
+CLEANUP_CHECKPOINT = BASE_DIR / 'cleanup_checkpoint.json'
+
+# Лента событий профилей (accounts.events, GET /api/v1/events/?after=<seq>&wait=<s>): кэш с версией ленты
+# для долгого опроса, ожидание фиксации более ранних номеров, период проверки и предельное ожидание,
+# размер страницы и срок хранения событий (очищает cleanup_expired)
+
+EVENTS_ENABLED = True
+
+EVENTS_CACHE = 'default'
+
+EVENTS_SETTLE_SECONDS = 5
+
+EVENTS_POLL_SECONDS = 0.5
+
+EVENTS_MAX_WAIT = 30
+
+EVENTS_PAGE_SIZE = 100
+
+EVENTS_MAX_PAGE_SIZE = 1000
+
+EVENTS_RETENTION_DAYS = 7
+
+# Ограничение частоты запросов OTP до обращения к базе:
+# {область: {ключ (phone, ip, invite): (запросов, за период в секундах)}}
+
+RATELIMIT_BACKEND = 'accounts.ratelimit.CacheRateLimiter'
+
+RATELIMIT_CACHE = 'default'
+
+RATELIMITS = {
+    'otp_issue': {'phone': (3, OTP_RETRY_TIMEOUT), 'ip': (20, 60), 'invite': (50, 3600)},
+    'otp_verify': {'phone': (OTP_ATTEMPTS * 2, OTP_LIFETIME), 'ip': (30, 60)},
+}
+
+# Асинхронные обработчики /api/v1/login/ и /api/v1/profile/ (accounts.async_views).
+# Имеет смысл при запуске под ASGI: uvicorn config.asgi:application
+
+API_ASYNC = False
+
+# Сессии: чтение из кэша, запись сквозь кэш в таблицу django_session
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Пользователь с профилем для аутентифицированных запросов тоже берётся из кэша
+
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedUserBackend']
+
+SESSION_USER_CACHE = 'default'
+
+SESSION_USER_CACHE_TIMEOUT = 300
+
+# Кэш ответов POST /api/v1/profile/: алиас CACHES, время жизни и размер LRU в памяти процесса
+
+PROFILE_CACHE = 'default'
+
+PROFILE_CACHE_TIMEOUT = 300
+
+PROFILE_CACHE_LOCAL_SIZE = 10000
+
+# Миниатюры аватаров (WebP), которые фоновый пул делает из загруженного исходника
+
+AVATAR_SIZES = (64, 256, 512)
+
+AVATAR_DEFAULT_SIZE = 256
+
+AVATAR_QUALITY = 80
+
+AVATAR_WORKERS = 2
+
+AVATAR_PROCESS_ASYNC = True
+
+# Служебные клиенты (accounts.permissions): лента событий, пакетные профили и /metrics - с заголовком Authorization: Bearer <токен>,
+# токен - один из SERVICE_TOKENS (через запятую в переменной окружения), либо вход сотрудника (is_staff)
+
+SERVICE_TOKENS = [token for token in os.environ.get('SERVICE_TOKENS', '').split(',') if token]
+
+# Метрики запросов (accounts.metrics): гистограммы в памяти процесса, GET /metrics в формате Prometheus.
+# METRICS_SLOW_REQUEST_SECONDS - порог для записи медленных запросов с их SQL в лог (None - не писать)
+
+METRICS_ENABLED = True
+
+METRICS_SLOW_REQUEST_SECONDS = None
+
+# Админка больших таблиц (accounts.admin): без фильтров число строк на PostgreSQL - оценка из статистики,
+# иначе считается не больше ADMIN_COUNT_LIMIT строк; ADMIN_TOP_INVITERS - пригласивших в фильтре "приглашён по коду"
+
+ADMIN_COUNT_LIMIT = 10000
+
+ADMIN_TOP_INVITERS = 10